@@ -0,0 +1,90 @@
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+from models import Book, Loan
+from response_cache import books_changed
+
+# Book.available_count is the number of copies on the shelf. It only changes
+# through these conditional UPDATEs, inside the same transaction as the loan
+# state change, so concurrent approvals can't take the last copy twice.
+# Each change also marks the book's cached catalog responses as stale.
+
+
+def take_copy(db: Session, book_id: int) -> bool:
+    result = db.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.available_count > 0)
+        .values(available_count=Book.available_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    books_changed(db, [book_id])
+    return result.rowcount == 1
+
+
+def take_copies(db: Session, counts: dict[int, int]) -> int:
+    # Batch form of take_copy: {book_id: copies}; returns how many books had enough on the shelf
+    if not counts:
+        return 0
+    books = Book.__table__
+    result = db.execute(
+        update(books)
+        .where(books.c.id == bindparam("b_id"), books.c.available_count >= bindparam("copies"))
+        .values(available_count=books.c.available_count - bindparam("copies")),
+        [{"b_id": book_id, "copies": copies} for book_id, copies in counts.items()],
+    )
+    books_changed(db, counts)
+    return result.rowcount
+
+
+def release_copy(db: Session, book_id: int):
+    db.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(available_count=Book.available_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    books_changed(db, [book_id])
+
+
+def set_quantity(db: Session, book_id: int, quantity: int) -> bool:
+    # Shift availability by the change in total copies; refuses to drop below the copies on loan
+    result = db.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.available_count + (quantity - Book.quantity) >= 0)
+        .values(available_count=Book.available_count + (quantity - Book.quantity), quantity=quantity)
+        .execution_options(synchronize_session=False)
+    )
+    books_changed(db, [book_id])
+    return result.rowcount == 1
+
+
+def reconcile_availability(db: Session, fix: bool = True) -> list[dict]:
+    # Recompute every counter from loans in one grouped pass and report (and optionally repair) drift
+    on_loan = (
+        select(Loan.book_id, func.count(Loan.id).label("on_loan"))
+        .where(Loan.status == "approved", Loan.returned == False)
+        .group_by(Loan.book_id)
+        .subquery()
+    )
+    expected = Book.quantity - func.coalesce(on_loan.c.on_loan, 0)
+    rows = db.execute(
+        select(Book.id, Book.available_count, expected)
+        .outerjoin(on_loan, on_loan.c.book_id == Book.id)
+        .where(Book.available_count != expected)
+    ).all()
+    drift = [{"book_id": book_id, "available_count": actual, "expected": wanted} for book_id, actual, wanted in rows]
+    if fix and drift:
+        db.execute(
+            update(Book).execution_options(synchronize_session=False),
+            [{"id": row["book_id"], "available_count": max(row["expected"], 0)} for row in drift],
+        )
+        books_changed(db, [row["book_id"] for row in drift])
+        db.commit()
+    return drift
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        for row in reconcile_availability(session):
+            print(row)
@@ -0,0 +1,48 @@
+"""Catalog throughput and latency on the sync vs the async (aiosqlite) stack.
+
+    python -m benchmarks.async_vs_sync
+"""
+import asyncio
+import time
+import httpx
+from benchmarks.common import temp_engine, temp_async_sessionmaker, make_app, seed, percentiles
+
+
+async def drive(app, concurrency: int, requests_per_client: int):
+    samples = []
+
+    async def client_loop(client, i):
+        for j in range(requests_per_client):
+            start = time.perf_counter()
+            if j % 2:
+                await client.get(f"/books/{(i * requests_per_client + j) % 1000 + 1}")
+            else:
+                await client.get("/books/", params={"limit": 20})
+            samples.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"requests": len(samples), "rps": round(len(samples) / elapsed, 1), **percentiles(samples)}
+
+
+async def run(concurrency_levels=(10, 100, 500), requests_per_client: int = 10):
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=1_000, loans=2_000)
+    db.close()
+    # The async engine's pool is bound to this event loop, so everything runs inside one asyncio.run()
+    async_engine, AsyncSessionLocal = temp_async_sessionmaker(engine)
+
+    sync_app = make_app(SessionLocal)
+    async_app = make_app(SessionLocal, AsyncSessionLocal)
+    for concurrency in concurrency_levels:
+        print(f"concurrency={concurrency:<4} sync ", await drive(sync_app, concurrency, requests_per_client))
+        print(f"concurrency={concurrency:<4} async", await drive(async_app, concurrency, requests_per_client))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
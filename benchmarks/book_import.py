@@ -0,0 +1,64 @@
+"""Throughput and peak memory of the bulk catalog import.
+
+    python -m benchmarks.book_import [rows]
+
+The upload is generated to a temp file first, as an UploadFile would spool it,
+so the peak reported is what the importer itself holds while parsing and upserting.
+"""
+import csv
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import func, select
+from benchmarks.common import temp_engine
+from book_import import import_books
+from models import Book
+
+FIELDS = ["title", "author", "isbn", "quantity", "description", "category"]
+
+
+def write_upload(rows: int, fmt: str, bad_every: int = 1000):
+    upload = tempfile.TemporaryFile()
+    with open(upload.fileno(), "w", encoding="utf-8", newline="", closefd=False) as out:
+        writer = csv.DictWriter(out, FIELDS) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for i in range(rows):
+            row = {
+                "title": f"Book {i}", "author": f"Author {i % 500}", "isbn": f"isbn-{i}",
+                # A sprinkling of invalid rows exercises the error report
+                "quantity": -1 if bad_every and i % bad_every == 0 else i % 5 + 1,
+                "description": f"Description of book {i}", "category": f"Category {i % 20}",
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + "\n")
+    upload.seek(0)
+    return upload
+
+
+def run(rows: int = 100_000):
+    for fmt in ("csv", "ndjson"):
+        engine, SessionLocal = temp_engine()
+        for label in ("insert", "re-import"):
+            upload = write_upload(rows, fmt)
+            with SessionLocal() as db:
+                tracemalloc.start()
+                start = time.perf_counter()
+                report = import_books(db, upload, fmt)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                total = db.scalar(select(func.count()).select_from(Book))
+            upload.close()
+            print(f"{fmt:>6} {label:>9}: {rows} rows in {elapsed:6.2f} s = {rows / elapsed:8.0f} rows/s  "
+                  f"peak {peak / 2**20:5.1f} MiB  imported={report['imported']} failed={report['failed']} "
+                  f"books={total}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
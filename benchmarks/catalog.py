@@ -0,0 +1,41 @@
+"""Query count and latency of the catalog listing as the library grows.
+
+    python -m benchmarks.catalog
+"""
+import json
+import time
+from benchmarks.common import temp_engine, count_queries, seed
+from routers.books import get_books, get_book, DEFAULT_PAGE_SIZE
+
+
+def list_page(db, cursor=None, sort="id"):
+    response = get_books(cursor=cursor, limit=DEFAULT_PAGE_SIZE, category=None, author=None, sort=sort, db=db)
+    return json.loads(response.body), response.headers.get("X-Next-Cursor")
+
+
+def run(sizes=(100, 1_000, 10_000, 20_000), repeat: int = 20):
+    for n in sizes:
+        engine, SessionLocal = temp_engine()
+        db = SessionLocal()
+        seed(db, books=n, loans=n * 2)
+        db.expire_all()
+
+        with count_queries(engine) as counter:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list_page(db)
+            elapsed = (time.perf_counter() - start) / repeat
+        list_queries = counter["queries"] // repeat
+
+        with count_queries(engine) as counter:
+            start = time.perf_counter()
+            get_book(n // 2, db)
+            detail_elapsed = time.perf_counter() - start
+        print(f"books={n:>6}  first page: {list_queries} queries, {elapsed * 1000:7.2f} ms  "
+              f"detail: {counter['queries']} queries, {detail_elapsed * 1000:7.2f} ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,134 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from database import Base, get_db, get_async_db, make_engine, make_async_engine
+from models import Book, User, Loan
+from search import setup_search
+from availability import reconcile_availability
+from stats import rebuild_stats
+
+
+def temp_engine(**kwargs):
+    # Same pool and pragma profile as the app's engine, on a throwaway file
+    path = os.path.join(tempfile.mkdtemp(prefix="library-bench-"), "bench.db")
+    engine = make_engine(f"sqlite:///{path}", **kwargs)
+    Base.metadata.create_all(bind=engine)
+    setup_search(engine)
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+
+def temp_async_sessionmaker(engine):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine(engine.url.set(drivername="sqlite+aiosqlite"))
+    return async_engine, async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def make_app(SessionLocal, AsyncSessionLocal=None):
+    # The real routers bound to a benchmark database, without main.py's startup side effects
+    from routers import auth, books, books_async, dashboard, loans, users
+
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/auth")
+    app.include_router(dashboard.router, prefix="/dashboard")
+    if AsyncSessionLocal is not None:
+        app.include_router(books_async.router, prefix="/books")
+    app.include_router(books.router, prefix="/books")
+    app.include_router(users.router, prefix="/users")
+    app.include_router(loans.router, prefix="/loans")
+
+    def get_bench_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_bench_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_bench_db
+    app.dependency_overrides[get_async_db] = get_bench_async_db
+    return app
+
+
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+    return {"p50_ms": pick(50) * 1000, "p95_ms": pick(95) * 1000, "p99_ms": pick(99) * 1000}
+
+
+@contextmanager
+def count_queries(engine):
+    counter = {"queries": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(db, books: int, users: int = 100, loans: int = 0, seed: int = 42):
+    rng = random.Random(seed)
+    categories = ["Science", "History", "Fiction", "Engineering", "Law", "Medicine"]
+    db.bulk_insert_mappings(User, [
+        {
+            "name": f"User {i}",
+            "matric_no": f"MAT{i:06d}",
+            "department": "Bench",
+            "role": "student",
+            "hashed_password": "x",
+        }
+        for i in range(1, users + 1)
+    ])
+    db.bulk_insert_mappings(Book, [
+        {
+            "title": f"Book {i}",
+            "author": f"Author {i % 500}",
+            "isbn": f"978{i:010d}",
+            "quantity": rng.randint(1, 5),
+            "description": f"Description of book {i}",
+            "category": rng.choice(categories),
+        }
+        for i in range(1, books + 1)
+    ])
+    today = date.today()
+    pending = set()
+
+    def loan():
+        # Only approved loans get dates and can be returned, as the routes would leave them
+        status = rng.choice(["approved", "approved", "pending", "rejected"])
+        user_id, book_id = rng.randint(1, users), rng.randint(1, books)
+        if status == "pending":
+            # One pending request per user and book (ux_loans_pending_user_book)
+            status = "rejected" if (user_id, book_id) in pending else status
+            pending.add((user_id, book_id))
+        approved = status == "approved"
+        return {
+            "user_id": user_id,
+            "book_id": book_id,
+            "request_date": today - timedelta(days=20),
+            "borrowed_on": today - timedelta(days=20) if approved else None,
+            "due_date": today - timedelta(days=6) + timedelta(days=rng.randint(0, 14)) if approved else None,
+            "returned": approved and rng.random() < 0.5,
+            "status": status,
+        }
+
+    for start in range(0, loans, 50_000):
+        db.bulk_insert_mappings(Loan, [loan() for _ in range(min(50_000, loans - start))])
+    db.commit()
+    reconcile_availability(db)
+    rebuild_stats(db)
+    db.commit()
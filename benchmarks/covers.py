@@ -0,0 +1,50 @@
+"""Bytes per cover for a catalog grid page, original upload vs renditions, and render cost.
+
+    python -m benchmarks.covers
+"""
+import os
+import random
+import tempfile
+import time
+from PIL import Image, ImageDraw, ImageFilter
+from covers import COVER_FORMATS, COVER_WIDTHS, _rendition_name, render_renditions
+from routers.books import DEFAULT_PAGE_SIZE
+
+
+def photo_like(path: str, size=(1600, 2400), seed: int = 42):
+    # Random shapes plus noise compress about as badly as a photographed cover
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + rng.randrange(50, 600), y + rng.randrange(50, 600)),
+                     fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    Image.blend(image, noise, 0.15).save(path, "JPEG", quality=92)
+
+
+def run(repeat: int = 5):
+    directory = tempfile.mkdtemp(prefix="library-covers-")
+    path = os.path.join(directory, "cover.jpg")
+    photo_like(path)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render_renditions(path)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    original = os.path.getsize(path)
+    print(f"original: {original / 1024:8.1f} KiB  -> grid page of {DEFAULT_PAGE_SIZE}: "
+          f"{original * DEFAULT_PAGE_SIZE / 2**20:6.2f} MiB")
+    for size in COVER_WIDTHS:
+        for ext in COVER_FORMATS:
+            rendition = os.path.getsize(_rendition_name(path, size, ext))
+            print(f"{size:>6} {ext:>4}: {rendition / 1024:8.1f} KiB  -> grid page of {DEFAULT_PAGE_SIZE}: "
+                  f"{rendition * DEFAULT_PAGE_SIZE / 2**20:6.2f} MiB")
+    print(f"render all renditions: {elapsed * 1000:.0f} ms per cover (worker pool, off the request path)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,64 @@
+"""Overdue sweep over a large loans table, and read latency while it runs.
+
+    python -m benchmarks.fine_sweep [loans]
+
+The sweep commits every batch, so the write lock is held for one batch at a
+time; a reader thread samples the cost of the fine and overdue reads meanwhile.
+"""
+import sys
+import threading
+import time
+from datetime import date
+from sqlalchemy import func, select
+from benchmarks.common import percentiles, seed, temp_engine
+from fines import FINE_SWEEP_BATCH_SIZE, sweep_batch, user_fines
+from models import Fine
+
+
+def run(loans: int = 1_000_000):
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        seed(db, books=20_000, users=5_000, loans=loans)
+        print(f"seeded {loans} loans in {time.perf_counter() - start:.1f} s")
+
+    stop = threading.Event()
+    reads = []
+
+    def reader():
+        with SessionLocal() as db:
+            user_id = 1
+            while not stop.is_set():
+                start = time.perf_counter()
+                user_fines(db, user_id)
+                db.scalars(select(Fine).where(Fine.returned == False).order_by(Fine.due_date, Fine.loan_id).limit(50)).all()
+                reads.append(time.perf_counter() - start)
+                db.rollback()
+                user_id = user_id % 5_000 + 1
+                time.sleep(0.005)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    batch_times = []
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        after_id = 0
+        while True:
+            batch_start = time.perf_counter()
+            after_id = sweep_batch(db, date.today(), after_id)
+            if after_id is None:
+                break
+            batch_times.append(time.perf_counter() - batch_start)
+        elapsed = time.perf_counter() - start
+        fines = db.scalar(select(func.count()).select_from(Fine))
+    stop.set()
+    thread.join()
+
+    print(f"swept {fines} overdue loans in {elapsed:.2f} s: {len(batch_times)} batches of {FINE_SWEEP_BATCH_SIZE}, "
+          f"longest batch {max(batch_times, default=0) * 1000:.0f} ms")
+    print("reads during sweep:", {k: round(v, 2) for k, v in percentiles(reads).items()}, f"n={len(reads)}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
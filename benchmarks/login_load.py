@@ -0,0 +1,63 @@
+"""Catalog read latency while /auth/login is being hammered.
+
+    python -m benchmarks.login_load
+    PASSWORD_WORKERS=0 python -m benchmarks.login_load   # bcrypt in the request threadpool
+
+The storm runs once without rate limiting (bcrypt load shedding only) and once
+with the per-IP and per-account login limits turned back on.
+"""
+import asyncio
+import time
+import httpx
+import rate_limit
+from benchmarks.common import temp_engine, make_app, seed, percentiles
+from hashing import password_pool
+from models import User
+from utils import get_password_hash
+
+
+async def read_catalog(client, samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/books/")
+        samples.append(time.perf_counter() - start)
+
+
+async def hammer_login(client, statuses, stop):
+    while not stop.is_set():
+        response = await client.post("/auth/login", data={"username": "MAT000001", "password": "secret"})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def measure(app, logins: int, readers: int, seconds: float):
+    samples, statuses, stop = [], {}, asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tasks = [asyncio.create_task(read_catalog(client, samples, stop)) for _ in range(readers)]
+        tasks += [asyncio.create_task(hammer_login(client, statuses, stop)) for _ in range(logins)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return {"reads": len(samples), **percentiles(samples), "login_statuses": statuses}
+
+
+def run(logins: int = 200, readers: int = 8, seconds: float = 3.0):
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=2_000, loans=2_000)
+    db.query(User).filter(User.matric_no == "MAT000001").update({"hashed_password": get_password_hash("secret")})
+    db.commit()
+    db.close()
+    app = make_app(SessionLocal)
+
+    print("baseline      ", asyncio.run(measure(app, 0, readers, seconds)))
+    rate_limit.RATE_LIMIT_ENABLED = False
+    print("login storm   ", asyncio.run(measure(app, logins, readers, seconds)))
+    print("hashing pool  ", password_pool.stats())
+    rate_limit.RATE_LIMIT_ENABLED = True
+    print("rate limited  ", asyncio.run(measure(app, logins, readers, seconds)))
+    password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    run()
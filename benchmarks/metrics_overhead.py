@@ -0,0 +1,44 @@
+"""Cost of the request instrumentation: the same catalog reads with metrics off and on.
+
+    python -m benchmarks.metrics_overhead
+"""
+import asyncio
+import time
+import httpx
+from benchmarks.common import temp_engine, make_app, seed, percentiles
+from metrics import MetricsMiddleware, instrument_engine
+
+
+async def drive(app, requests: int):
+    samples = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            if i % 2:
+                await client.get(f"/books/{i % 1000 + 1}")
+            else:
+                await client.get("/books/", params={"limit": 20})
+            samples.append(time.perf_counter() - start)
+    return {"rps": round(len(samples) / sum(samples), 1), **{k: round(v, 3) for k, v in percentiles(samples).items()}}
+
+
+async def run(requests: int = 3_000):
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=1_000, loans=2_000)
+    db.close()
+
+    plain = make_app(SessionLocal)
+    await drive(plain, 200)  # warm up
+    print("metrics off", await drive(plain, requests))
+
+    instrument_engine(engine)
+    instrumented = make_app(SessionLocal)
+    instrumented.add_middleware(MetricsMiddleware)
+    print("metrics on ", await drive(instrumented, requests))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
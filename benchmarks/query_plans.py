@@ -0,0 +1,91 @@
+"""EXPLAIN QUERY PLAN checks for the hot filter paths; exits non-zero on a regression.
+
+    python -m benchmarks.query_plans
+"""
+import sys
+from sqlalchemy import func, select, text
+from benchmarks.common import temp_engine, seed
+from datetime import date
+from models import Book, Fine, Loan, HoldRequest
+from routers.books import books_page_select, encode_cursor
+from loan_history import loan_history_select
+
+# name -> (statement, substrings that must appear in the plan)
+def checks():
+    return {
+        "catalog page after a title cursor": (
+            books_page_select(encode_cursor(Book(id=10, title="Book 10"), "title"), 50, None, None, "title"),
+            ["ix_books_title_id (title>?)"],
+        ),
+        "catalog page of a category": (
+            books_page_select(None, 50, "Law", None, "id"),
+            ["ix_books_category_id (category=?)"],
+        ),
+        "copies of a book on loan": (
+            select(func.count(Loan.id)).where(Loan.book_id == 1, Loan.status == "approved", Loan.returned == False),
+            ["ix_loans_book_status_returned"],
+        ),
+        "user's open loan for a book": (
+            select(Loan).where(Loan.book_id == 1, Loan.user_id == 1, Loan.returned == False),
+            ["USING INDEX"],
+        ),
+        "user's loan history page": (
+            loan_history_select(1, 500, 50),
+            ["ix_loans_user_history (user_id=? AND id<?)"],
+        ),
+        "all open loans": (
+            select(Loan).where(Loan.returned == False),
+            ["ix_loans_returned"],
+        ),
+        "overdue sweep batch": (
+            select(Loan.id).where(
+                Loan.returned == False, Loan.status == "approved", Loan.due_date < date.today(), Loan.id > 100
+            ).order_by(Loan.id).limit(5000),
+            ["ix_loans_returned (returned=? AND rowid>?)"],
+        ),
+        "overdue list page": (
+            select(Fine).where(Fine.returned == False).order_by(Fine.due_date, Fine.loan_id).limit(51),
+            ["ix_fines_returned_due (returned=?)"],
+        ),
+        "user's fines": (
+            select(Fine).where(Fine.user_id == 1).order_by(Fine.due_date),
+            ["ix_fines_user_returned (user_id=?)"],
+        ),
+        "head of a book's hold queue": (
+            select(HoldRequest).where(HoldRequest.book_id == 1).order_by(HoldRequest.request_date, HoldRequest.id).limit(1),
+            ["ix_hold_requests_book_queue (book_id=?)"],
+        ),
+        "existing hold": (
+            select(HoldRequest).where(HoldRequest.user_id == 1, HoldRequest.book_id == 1),
+            ["uq_hold_requests_user_book"],
+        ),
+    }
+
+
+def query_plan(db, stmt) -> str:
+    sql = str(stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return "\n".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def run() -> bool:
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=2_000, loans=10_000)
+    db.execute(text("ANALYZE"))
+    ok = True
+    for name, (stmt, expected) in checks().items():
+        plan = query_plan(db, stmt)
+        missing = [needle for needle in expected if needle not in plan]
+        if "SCAN loans" in plan:
+            missing.append("no full scan of loans")
+        ok &= not missing
+        print(f"{'ok  ' if not missing else 'FAIL'} {name}")
+        if missing:
+            print("     expected:", ", ".join(missing))
+            print("     " + plan.replace("\n", "\n     "))
+    db.close()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,108 @@
+"""Cost of a rate-limit check, and admission control under concurrent load.
+
+    python -m benchmarks.rate_limit
+    RATE_LIMIT_URL=fakeredis:// python -m benchmarks.rate_limit   # Redis buckets, in-process
+
+Times TokenBuckets.take per backend, then fires concurrent bursts at the real
+routes and checks that: a login burst from one address gets exactly the bucket
+capacity through and 429 + Retry-After for the rest; concurrent duplicate loan
+requests leave one pending loan; the concurrency limit turns away what doesn't
+fit. Exits 1 if any check fails.
+"""
+import asyncio
+import sys
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, select
+import rate_limit
+from benchmarks.common import temp_engine, make_app, seed
+from hashing import password_pool
+from models import Loan, User
+from utils import create_access_token, get_password_hash
+
+
+def time_checks(buckets, checks: int = 100_000) -> float:
+    # µs per take, spread over 1000 keys like a crowd of clients
+    keys = [f"bench:{i}" for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(checks):
+        buckets.take(keys[i % 1000], 1_000_000, 1_000.0)
+    return (time.perf_counter() - start) / checks * 1e6
+
+
+async def burst(client, calls: int, method: str, url: str, **kwargs) -> list:
+    return await asyncio.gather(*(client.request(method, url, **kwargs) for _ in range(calls)))
+
+
+def summary(responses) -> dict:
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+
+async def load_checks(SessionLocal, failures: list):
+    app = make_app(SessionLocal)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Wrong passwords: every attempt that gets past the limits costs a bcrypt check
+        capacity = rate_limit.login_account_limit.capacity
+        responses = await burst(client, 50, "POST", "/auth/login", data={"username": "MAT000002", "password": "wrong"})
+        statuses = summary(responses)
+        print("login burst (one account)  ", statuses)
+        if statuses.get(429, 0) != 50 - capacity or not all("retry-after" in r.headers for r in responses if r.status_code == 429):
+            failures.append(f"login burst: expected {capacity} attempts through, got {statuses}")
+
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'MAT000003'})}"}
+        responses = await burst(client, 20, "POST", "/dashboard/request", headers=headers, json={"book_id": 1})
+        statuses = summary(responses)
+        with SessionLocal() as db:
+            pending = db.scalar(
+                select(func.count(Loan.id)).where(Loan.user_id == 3, Loan.book_id == 1, Loan.status == "pending")
+            )
+        print("duplicate loan requests    ", statuses, f"pending={pending}")
+        if statuses.get(200) != 1 or pending != 1:
+            failures.append(f"duplicate loan requests: {statuses}, {pending} pending")
+
+    # The limit on its own, around a slow route
+    limit = rate_limit.ConcurrencyLimit(4, retry_after=1)
+    slow = FastAPI()
+
+    @slow.get("/slow", dependencies=[Depends(limit)])
+    async def slow_route():
+        await asyncio.sleep(0.2)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=slow), base_url="http://bench") as client:
+        statuses = summary(await burst(client, 20, "GET", "/slow"))
+    print("concurrency limit 4, 20 at once", statuses)
+    if statuses != {200: 4, 429: 16} or limit.in_flight:
+        failures.append(f"concurrency limit: {statuses}, {limit.in_flight} still in flight")
+
+
+def run() -> int:
+    print(f"take ({rate_limit.RATE_LIMIT_URL}) {time_checks(rate_limit.buckets):.2f} µs")
+    if not rate_limit.RATE_LIMIT_URL.startswith("memory://"):
+        print(f"take (memory://) {time_checks(rate_limit.make_buckets('memory://')):.2f} µs")
+    rate_limit.buckets.clear()
+
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        seed(db, books=100, users=10)
+        db.query(User).update({"hashed_password": get_password_hash("secret")})
+        db.commit()
+    failures = []
+    rate_limit.RATE_LIMIT_ENABLED = True
+    try:
+        asyncio.run(load_checks(SessionLocal, failures))
+    finally:
+        password_pool.shutdown()
+        engine.dispose()
+    print("rejected", rate_limit.rate_limit_stats())
+    for failure in failures:
+        print("FAIL", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,87 @@
+"""Catalog read throughput with and without the response cache.
+
+    python -m benchmarks.response_cache
+    CACHE_URL=fakeredis:// python -m benchmarks.response_cache   # Redis backend, in-process
+
+Runs the same mix of list pages and book details against the app without the
+middleware, with it, with clients revalidating via If-None-Match, and with a
+copy being taken off the shelf every `write_every` requests (which evicts the
+responses showing that book).
+"""
+import asyncio
+import random
+import time
+import httpx
+from availability import take_copy
+from benchmarks.common import temp_engine, make_app, seed, percentiles
+from response_cache import ResponseCacheMiddleware, cache_stats, response_cache
+
+
+def workload(books: int, requests: int, seed_value: int = 7):
+    # Skewed like real traffic: a few popular books and the first pages get most hits
+    rng = random.Random(seed_value)
+    paths = []
+    for _ in range(requests):
+        if rng.random() < 0.4:
+            paths.append(("/books/", {"limit": 20, "category": rng.choice(["Science", "History", "Fiction"])}))
+        else:
+            paths.append((f"/books/{min(int(rng.paretovariate(1.2)), books)}", None))
+    return paths
+
+
+async def drive(app, paths, concurrency: int, revalidate: bool = False, write=None, write_every: int = 0):
+    samples, etags = [], {}
+    queue = list(enumerate(paths))
+
+    async def client_loop(client):
+        while queue:
+            i, (path, params) = queue.pop()
+            if write_every and i % write_every == 0:
+                await asyncio.to_thread(write, i)
+            key = (path, str(params))
+            headers = {"If-None-Match": etags[key]} if revalidate and key in etags else {}
+            start = time.perf_counter()
+            response = await client.get(path, params=params, headers=headers)
+            samples.append(time.perf_counter() - start)
+            if "etag" in response.headers:
+                etags[key] = response.headers["etag"]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"rps": round(len(samples) / elapsed, 1), **{k: round(v, 2) for k, v in percentiles(samples).items()}}
+
+
+async def run(books: int = 10_000, requests: int = 5_000, concurrency: int = 20, write_every: int = 100):
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=books, loans=books * 2)
+    db.close()
+
+    def write(i):
+        with SessionLocal() as session:
+            take_copy(session, i % 50 + 1)
+            session.commit()
+
+    uncached = make_app(SessionLocal)
+    cached = make_app(SessionLocal)
+    cached.add_middleware(ResponseCacheMiddleware)
+    paths = workload(books, requests)
+
+    print("uncached            ", await drive(uncached, paths, concurrency))
+    for label, kwargs in (
+        ("cached              ", {}),
+        ("cached + revalidate ", {"revalidate": True}),
+        (f"cached + 1/{write_every} writes", {"write": write, "write_every": write_every}),
+    ):
+        response_cache.clear()
+        cache_stats.__init__()
+        result = await drive(cached, paths, concurrency, **kwargs)
+        print(label, result, {k: cache_stats.snapshot()[k] for k in ("hit_rate", "not_modified", "invalidations")})
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+"""Latency of /books/search over a large catalog.
+
+    python -m benchmarks.search
+"""
+import json
+import time
+from benchmarks.common import temp_engine, seed
+from routers.books import search_books
+
+
+def run(books: int = 100_000, queries=("Book 4242", "auth 12", "descr", "history"), repeat: int = 20):
+    engine, SessionLocal = temp_engine()
+    db = SessionLocal()
+    seed(db, books=books, loans=books // 10)
+    for q in queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = json.loads(search_books(q=q, limit=20, db=db).body)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"books={books}  q={q!r:<12} {len(results):>2} results  {elapsed * 1000:7.2f} ms")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
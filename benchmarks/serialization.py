@@ -0,0 +1,67 @@
+"""Time to turn 10k catalog rows into a JSON body, before and after the dict projection.
+
+    python -m benchmarks.serialization
+
+"models" is the previous path: ORM Book objects -> BookSchema per row ->
+FastAPI's response_model validation -> JSON. "dicts" is the current one:
+column rows -> book_dict -> orjson. Also reports what gzip and brotli do to
+the resulting body.
+"""
+import time
+import zlib
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from benchmarks.common import temp_engine, seed
+from compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+from models import Book
+from routers.books import book_dict, catalog_select, to_book_schema
+from schemas import Book as BookSchema
+from serialization import dumps
+
+
+def best_of(fn, repeat: int):
+    # (ms, result) of the fastest run
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append((time.perf_counter() - start, result))
+    best, result = min(runs, key=lambda run: run[0])
+    return best * 1000, result
+
+
+def run(books: int = 10_000, repeat: int = 5):
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        seed(db, books=books)
+    response_field = TypeAdapter(List[BookSchema])
+
+    def models():
+        with SessionLocal() as db:
+            rows = db.scalars(select(Book).order_by(Book.id)).all()
+            fetched = time.perf_counter()
+            body = response_field.dump_json(response_field.validate_python([to_book_schema(book) for book in rows]))
+            return time.perf_counter() - fetched, body
+
+    def dicts():
+        with SessionLocal() as db:
+            rows = db.execute(catalog_select().order_by(Book.id)).all()
+            fetched = time.perf_counter()
+            body = dumps([book_dict(row) for row in rows])
+            return time.perf_counter() - fetched, body
+
+    for name, fn in (("models", models), ("dicts ", dicts)):
+        total_ms, (serialize_s, body) = best_of(fn, repeat)
+        print(f"{name}  total {total_ms:7.1f} ms  build+serialize {serialize_s * 1000:7.1f} ms  body {len(body) / 1024:6.0f} KiB")
+
+    gzip_ms, gzipped = best_of(lambda: zlib.compress(body, GZIP_LEVEL), repeat)
+    print(f"gzip {GZIP_LEVEL}   {gzip_ms:6.1f} ms  {len(gzipped) / 1024:6.0f} KiB")
+    if brotli is not None:
+        br_ms, compressed = best_of(lambda: brotli.compress(body, quality=BROTLI_QUALITY), repeat)
+        print(f"brotli {BROTLI_QUALITY} {br_ms:6.1f} ms  {len(compressed) / 1024:6.0f} KiB")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,73 @@
+"""Catalog read throughput while loans are being written, default vs tuned SQLite.
+
+    python -m benchmarks.sqlite_concurrency
+"""
+import threading
+import time
+from datetime import date
+from sqlalchemy.exc import OperationalError
+from benchmarks.common import temp_engine, seed
+from models import Loan
+from routers.books import books_page_select
+
+
+def hammer(SessionLocal, readers: int, writers: int, seconds: float) -> dict:
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                db.execute(books_page_select(None, 50, None, None, "id")).all()
+                bump("reads")
+            except OperationalError:
+                bump("errors")
+            finally:
+                db.close()
+
+    def writer(i):
+        n = 0
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                n += 1
+                # Returned loans, as the app leaves them: pending ones would repeat user/book
+                # pairs and trip ux_loans_pending_user_book
+                db.add(Loan(user_id=i + 1, book_id=n % 1000 + 1, request_date=date.today(), borrowed_on=date.today(),
+                            due_date=date.today(), status="approved", returned=True, return_date=date.today()))
+                db.commit()
+                bump("writes")
+            except OperationalError:
+                bump("errors")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {key: round(value / seconds, 1) for key, value in counts.items()}
+
+
+def run(readers: int = 8, writers: int = 4, seconds: float = 5.0):
+    for profile, options in (("default", {"pragmas": None}), ("tuned", {})):
+        engine, SessionLocal = temp_engine(**options)
+        db = SessionLocal()
+        seed(db, books=1_000, loans=5_000)
+        db.close()
+        print(f"{profile:<8} per second:", hammer(SessionLocal, readers, writers, seconds))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,233 @@
+"""End-to-end API benchmark: seeds a synthetic library into a temp SQLite DB,
+drives the real endpoints through an in-process ASGI client at fixed
+concurrency and reports latency percentiles, throughput and SQL statements
+per request as JSON.
+
+    python -m benchmarks.suite --out results.json
+    python -m benchmarks.suite --books 50000 --loans 200000 --concurrency 32
+    python -m benchmarks.suite --thresholds benchmarks/thresholds.json --baseline results.json --max-regression 0.25
+
+Exits 1 when any request fails, when a scenario breaks an absolute threshold (`rps` is a minimum,
+every other key a maximum) or regresses by more than --max-regression against
+the baseline run (p95 latency, throughput or statements per request).
+benchmarks/thresholds.json holds generous latency limits for the default sizes;
+the statement counts in it are exact at any size and catch new N+1 queries. Rate
+limiting is off for the run.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import httpx
+from sqlalchemy import exists, select
+from benchmarks.common import temp_engine, make_app, seed, percentiles, count_queries
+from dependencies import get_current_user
+import rate_limit
+from hashing import password_pool
+from models import Book, HoldRequest, Loan, User
+from utils import create_access_token, get_password_hash
+
+PASSWORD = "secret"
+
+
+async def drive(client, calls, concurrency: int) -> dict:
+    # calls: (method, url, request kwargs); `concurrency` clients share one queue
+    samples, statuses = [], {}
+    queue = iter(calls)
+
+    async def client_loop():
+        for method, url, kwargs in queue:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        **{key: round(value, 3) for key, value in percentiles(samples).items()},
+    }
+
+
+def prepare(args):
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        seed(db, books=args.books, users=args.users, loans=args.loans, seed=args.seed)
+        db.query(User).update({"hashed_password": get_password_hash(PASSWORD)})
+        db.query(User).filter(User.id == 1).update({"role": "admin"})
+        db.commit()
+    return engine, SessionLocal
+
+
+async def run_scenarios(args, engine, SessionLocal) -> dict:
+    rng = random.Random(args.seed)
+    app = make_app(SessionLocal)
+    with SessionLocal() as db:
+        users = db.execute(select(User.id, User.matric_no).where(User.id != 1).order_by(User.id)).all()
+        # Books with one on the shelf and no open loan, request or hold: every request in the
+        # flow is accepted and approved, and each return finds only the flow's own loan (no
+        # overdue fine to settle, no hold to promote), so statement counts don't depend on the seed
+        opened = exists().where(Loan.book_id == Book.id, Loan.returned == False)
+        held = exists().where(HoldRequest.book_id == Book.id)
+        shelf = db.scalars(
+            select(Book.id).where(Book.available_count > 0, ~opened, ~held).order_by(Book.id).limit(args.requests)
+        ).all()
+    auth = lambda matric_no: {"Authorization": f"Bearer {create_access_token({'sub': matric_no})}"}
+    admin = auth("MAT000001")
+    student = {user_id: auth(matric_no) for user_id, matric_no in users}
+    categories = ["Science", "History", "Fiction", "Engineering", "Law", "Medicine"]
+    borrowers = [(users[i % len(users)][0], book_id) for i, book_id in enumerate(shelf)]
+
+    # name -> function returning the calls; run in order, since the loan flow builds on itself
+    scenarios = {
+        "login": lambda: [
+            ("POST", "/auth/login", {"data": {"username": users[i % len(users)][1], "password": PASSWORD}})
+            for i in range(args.logins)
+        ],
+        "catalog_page": lambda: [
+            ("GET", "/books/", {"params": {"limit": 50, "category": rng.choice(categories), "sort": rng.choice(["id", "title"])}})
+            for _ in range(args.requests)
+        ],
+        "book_detail": lambda: [
+            ("GET", f"/books/{rng.randint(1, args.books)}", {}) for _ in range(args.requests)
+        ],
+        "search": lambda: [
+            ("GET", "/books/search", {"params": {"q": f"Book {rng.randint(1, args.books)}"}}) for _ in range(args.requests)
+        ],
+        "loan_request": lambda: [
+            ("POST", "/dashboard/request", {"headers": student[user_id], "json": {"book_id": book_id}})
+            for user_id, book_id in borrowers
+        ],
+        "loan_approve": lambda: [
+            ("POST", f"/dashboard/{loan_id}/approve", {"headers": admin}) for loan_id in pending_loans()
+        ],
+        "loan_return": lambda: [
+            ("POST", "/dashboard/return", {"headers": student[user_id], "json": {"book_id": book_id}})
+            for user_id, book_id in borrowers
+        ],
+        "user_details": lambda: [
+            ("GET", f"/users/{rng.choice(users)[0]}/details", {"headers": admin}) for _ in range(args.requests)
+        ],
+        "dashboard_stats": lambda: [
+            ("GET", "/dashboard/stats", {"headers": admin}) for _ in range(args.requests)
+        ],
+    }
+
+    with SessionLocal() as db:
+        last_loan = db.scalar(select(Loan.id).order_by(Loan.id.desc()).limit(1)) or 0
+
+    def pending_loans():
+        # The requests loan_request just made
+        with SessionLocal() as db:
+            return db.scalars(
+                select(Loan.id).where(Loan.id > last_loan, Loan.status == "pending").order_by(Loan.id)
+            ).all()
+
+    def warm_tokens():
+        # A token's first use costs a user lookup (dependencies.auth_cache); resolve them
+        # all up front so the counts don't depend on how many users a scenario touches
+        with SessionLocal() as db:
+            for headers in [admin, *student.values()]:
+                get_current_user(headers["Authorization"].split()[1], db)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, build in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            calls = build()
+            warm_tokens()
+            with count_queries(engine) as counter:
+                result = await drive(client, calls, args.concurrency)
+            result["queries_per_request"] = round(counter["queries"] / max(result["requests"], 1), 2)
+            results[name] = result
+    return results
+
+
+def check(results: dict, config: dict, thresholds: dict, baseline: dict | None, max_regression: float) -> list[str]:
+    failures = [f"{name}: {result['errors']} failed requests" for name, result in results.items() if result["errors"]]
+    if baseline and baseline.get("config") != config:
+        # Different library sizes or concurrency aren't comparable
+        return failures + [f"baseline config {baseline.get('config')} differs from {config}"]
+    for name, limits in thresholds.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        for key, limit in limits.items():
+            value = result.get(key)
+            if value is None:
+                continue
+            if (value < limit) if key == "rps" else (value > limit):
+                failures.append(f"{name}: {key} {value} breaks threshold {limit}")
+    for name, before in (baseline or {}).get("scenarios", {}).items():
+        after = results.get(name)
+        if after is None:
+            continue
+        for key in ("p95_ms", "queries_per_request"):
+            if before.get(key) and after.get(key) is not None and after[key] > before[key] * (1 + max_regression):
+                failures.append(f"{name}: {key} {before[key]} -> {after[key]}")
+        if before.get("rps") and after.get("rps") is not None and after["rps"] < before["rps"] * (1 - max_regression):
+            failures.append(f"{name}: rps {before['rps']} -> {after['rps']}")
+    return failures
+
+
+def commit_id() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--loans", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="run just these scenarios")
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--thresholds", help="JSON file: {scenario: {metric: limit}}")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    # Every simulated client shares one address and a handful of accounts
+    rate_limit.RATE_LIMIT_ENABLED = False
+    engine, SessionLocal = prepare(args)
+    try:
+        results = asyncio.run(run_scenarios(args, engine, SessionLocal))
+    finally:
+        password_pool.shutdown()
+        engine.dispose()
+
+    thresholds = json.load(open(args.thresholds)) if args.thresholds else {}
+    baseline = json.load(open(args.baseline)) if args.baseline else None
+    config = {key: getattr(args, key) for key in ("books", "users", "loans", "requests", "logins", "concurrency", "seed")}
+    failures = check(results, config, thresholds, baseline, args.max_regression)
+    report = {
+        "commit": commit_id(),
+        "config": config,
+        "scenarios": results,
+        "failures": failures,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(output + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Peak memory and bytes read while a large profile picture is uploaded.
+
+    python -m benchmarks.upload_memory [megabytes]
+
+The body is fed to the app chunk by chunk through a raw ASGI call (a test
+client would buffer it), with tracemalloc tracking what the app holds.
+Exits non-zero if the accepted upload's peak grows past a few chunks.
+"""
+import asyncio
+import sys
+import tempfile
+import tracemalloc
+from benchmarks.common import make_app, seed, temp_engine
+from routers import users
+from utils import create_access_token
+
+CHUNK = 64 * 1024
+BOUNDARY = b"benchboundary"
+PNG_HEAD = b"\x89PNG\r\n\x1a\n" + b"\x00" * 8
+PEAK_LIMIT = 4 * 1024 * 1024
+
+
+async def upload(app, token: str, size: int, head: bytes = PNG_HEAD, content_length: bool = True) -> dict:
+    prefix = (b"--" + BOUNDARY + b"\r\nContent-Disposition: form-data; name=\"file\"; filename=\"me.png\"\r\n"
+              b"Content-Type: image/png\r\n\r\n")
+    suffix = b"\r\n--" + BOUNDARY + b"--\r\n"
+    headers = [
+        (b"authorization", f"Bearer {token}".encode()),
+        (b"content-type", b"multipart/form-data; boundary=" + BOUNDARY),
+    ]
+    if content_length:
+        headers.append((b"content-length", str(len(prefix) + size + len(suffix)).encode()))
+
+    def body():
+        yield prefix + head
+        sent = len(head)
+        filler = b"\x5a" * CHUNK
+        while sent < size:
+            piece = filler[:min(CHUNK, size - sent)]
+            sent += len(piece)
+            yield piece
+        yield suffix
+
+    chunks = body()
+    state = {"read": 0, "status": None, "done": False}
+
+    async def receive():
+        if state["done"]:
+            await asyncio.Event().wait()  # nothing more until the app finishes
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            state["done"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        state["read"] += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/users/me/picture", "raw_path": b"/users/me/picture", "query_string": b"", "root_path": "",
+        "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return state
+
+
+async def main(megabytes: int) -> bool:
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        seed(db, books=1, users=1)
+    app = make_app(SessionLocal)
+    token = create_access_token({"sub": "MAT000001"})
+    users.UPLOAD_DIR = tempfile.mkdtemp(prefix="library-uploads-")
+    size = megabytes * 1024 * 1024
+    default_cap = users.PICTURE_MAX_BYTES
+
+    ok = True
+    cases = [
+        ("accepted (cap raised)", size + 1, {}),
+        ("over cap, Content-Length", default_cap, {}),
+        ("over cap, chunked", default_cap, {"content_length": False}),
+        ("not an image", size + 1, {"head": b"GIF00a not really"}),
+    ]
+    for name, cap, kwargs in cases:
+        users.PICTURE_MAX_BYTES = cap
+        tracemalloc.start()
+        state = await upload(app, token, size, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>26}: status {state['status']}  body read {state['read'] / 2**20:7.2f} MiB  "
+              f"peak traced {peak / 2**20:5.2f} MiB")
+        if name.startswith("accepted"):
+            ok = state["status"] == 200 and peak < PEAK_LIMIT
+    engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)) else 1)
@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, Literal
+from pydantic import ValidationError
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import Book
+from schemas import BookCreate
+from response_cache import books_changed
+from stats import COPIES, ON_LOAN, rebuild_stats
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+ImportFormat = Literal["csv", "ndjson"]
+
+
+def _csv_rows(text: io.TextIOBase) -> Iterator[tuple[int, dict | None, str | None]]:
+    # Row numbers count the header as line 1 so they match what a spreadsheet shows
+    for line_no, row in enumerate(csv.DictReader(text), start=2):
+        yield line_no, {key: (value if value != "" else None) for key, value in row.items() if key}, None
+
+
+def _ndjson_rows(text: io.TextIOBase) -> Iterator[tuple[int, dict | None, str | None]]:
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def _upsert_statement(db: Session):
+    stmt = dialect_insert(db.get_bind())(Book)
+    # Re-importing an ISBN updates it; availability moves with the change in copies.
+    # flush() rejects rows that would leave fewer copies than are on loan; the WHERE
+    # skips one that a loan approved since then would push below zero.
+    available = Book.available_count + (stmt.excluded.quantity - Book.quantity)
+    # RETURNING lists the rows actually written, so skipped ones aren't counted as imported
+    return stmt.on_conflict_do_update(
+        index_elements=[Book.isbn],
+        set_={
+            "title": stmt.excluded.title,
+            "author": stmt.excluded.author,
+            "quantity": stmt.excluded.quantity,
+            "description": stmt.excluded.description,
+            "category": stmt.excluded.category,
+            "cover_image_url": case(
+                (stmt.excluded.cover_image_url.is_(None), Book.cover_image_url),
+                else_=stmt.excluded.cover_image_url,
+            ),
+            # A new cover URL makes the rendered thumbnails stale
+            "cover_renditions": case(
+                (stmt.excluded.cover_image_url.is_(None), Book.cover_renditions),
+                (stmt.excluded.cover_image_url == Book.cover_image_url, Book.cover_renditions),
+                else_=None,
+            ),
+            "available_count": available,
+        },
+        where=available >= 0,
+    ).returning(Book.isbn)
+
+
+def import_books(db: Session, file: BinaryIO, fmt: ImportFormat) -> dict:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    rows = _csv_rows(text) if fmt == "csv" else _ndjson_rows(text)
+    stmt = _upsert_statement(db)
+    report = {"processed": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    # isbn -> (line number, row), so a batch never upserts the same book twice (last row wins)
+    batch: dict[str, tuple[int, dict]] = {}
+
+    def fail(line_no: int, errors: list):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": line_no, "errors": errors})
+        else:
+            report["errors_truncated"] = True
+
+    def flush():
+        if not batch:
+            return
+        # Like set_quantity: a book can't end up with fewer copies than are on loan
+        on_loan = dict(db.execute(
+            select(Book.isbn, Book.quantity - Book.available_count).where(Book.isbn.in_(batch))
+        ).all())
+        rows = {}
+        for isbn, (line_no, row) in batch.items():
+            if row["quantity"] < (on_loan.get(isbn) or 0):
+                fail(line_no, [f"quantity: {row['quantity']} is less than the {on_loan[isbn]} copies on loan"])
+            else:
+                rows[isbn] = (line_no, row)
+        batch.clear()
+        if rows:
+            written = set(db.scalars(stmt, [row for _, row in rows.values()]).all())
+            books_changed(db, catalog=True)
+            db.commit()
+            report["imported"] += len(written)
+            for isbn, (line_no, row) in rows.items():
+                if isbn not in written:
+                    fail(line_no, [f"quantity: {row['quantity']} is less than the copies on loan"])
+
+    try:
+        for line_no, raw, error in rows:
+            report["processed"] += 1
+            if error:
+                fail(line_no, [error])
+                continue
+            try:
+                book = BookCreate.model_validate(raw)
+            except ValidationError as exc:
+                fail(line_no, [f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()])
+                continue
+            batch[book.isbn] = (line_no, {**book.model_dump(), "available_count": book.quantity})
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+        flush()
+    except (UnicodeDecodeError, csv.Error) as exc:
+        db.rollback()
+        report["errors"].append({"row": None, "errors": [f"Could not read file: {exc}"]})
+    finally:
+        text.detach()
+    if report["imported"]:
+        # Upserts can move copies between categories; recount those counters once,
+        # including for batches committed before a read error
+        rebuild_stats(db, (COPIES, ON_LOAN))
+        db.commit()
+    return report
@@ -0,0 +1,288 @@
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+try:
+    from redis.exceptions import RedisError, WatchError
+except ImportError:  # redis is optional: only needed for a redis:// CACHE_URL
+    RedisError = WatchError = None
+
+# Caches are built with make_cache(): CACHE_URL=memory:// (default) keeps them
+# per process; redis://host:6379/0 shares them between uvicorn workers, with
+# invalidations fanned out over pub/sub. fakeredis:// is an in-process stand-in
+# for trying the Redis backend without a server.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+# How long a worker may keep serving a Redis-backed entry from its own memory;
+# bounds the staleness if an invalidation message is lost
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "5"))
+# A Redis that stops answering fails the call after this long instead of hanging it
+CACHE_SOCKET_TIMEOUT_SECONDS = float(os.getenv("CACHE_SOCKET_TIMEOUT_SECONDS", "0.5"))
+
+# What a shared backend raises when it is unreachable; callers fall back to no caching
+CACHE_ERRORS = (OSError,) + ((RedisError,) if RedisError is not None else ())
+
+
+# Thread-safe LRU cache whose entries also expire after a TTL
+class TTLCache:
+    # Calls never do I/O, so async code may make them on the event loop
+    blocking = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Bumped on every invalidation so a value read from the DB before an
+        # invalidation can't be written back afterwards (see set()).
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any, frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value, _ = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None,
+            tags: Iterable[str] = ()):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + ttl, value, frozenset(tags))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        # Drops every entry set with any of these tags
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            for key in [key for key, (_, _, entry_tags) in self._data.items() if not tags.isdisjoint(entry_tags)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _to_json(value):
+    # Entries go into Redis as JSON, never pickle: whoever can write to a shared
+    # Redis must not be able to run code in the workers. Bytes and tuples are tagged.
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode()}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_to_json(item) for item in value]}
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
+
+
+def _from_json(value: dict):
+    # object_hook for json.loads: undoes the tags _to_json added
+    if "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+    if "__tuple__" in value:
+        return tuple(value["__tuple__"])
+    return value
+
+
+def _encode_entry(value, tags: list) -> bytes:
+    return json.dumps({"value": _to_json(value), "tags": tags}, separators=(",", ":")).encode()
+
+
+def _decode_entry(raw: bytes) -> tuple[Any, list]:
+    entry = json.loads(raw, object_hook=_from_json)
+    return entry["value"], entry["tags"]
+
+
+class RedisCache:
+    # Same interface as TTLCache, stored in Redis under "<namespace>:". Each
+    # worker keeps recent entries in a local TTLCache; every invalidation is
+    # published on the namespace's channel so the other workers drop theirs.
+    # Calls are network round trips: async code runs them in the threadpool.
+    blocking = True
+
+    def __init__(self, client, namespace: str, maxsize: int, ttl: float, local_ttl: float = CACHE_LOCAL_TTL_SECONDS):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, min(ttl, local_ttl))
+        self._origin = uuid.uuid4().hex
+        self._channel = f"{namespace}:invalidate"
+        self._generation_key = f"{namespace}:generation"
+        self._subscriber = None
+        self._lock = threading.Lock()
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:entry:{key}"
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _subscribe(self):
+        with self._lock:
+            if self._subscriber is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self._channel: self._on_message})
+                self._subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _on_message(self, message):
+        data = json.loads(message["data"])
+        if data["origin"] == self._origin:
+            return
+        if "key" in data:
+            self.local.delete(data["key"])
+        elif data["tags"] is None:
+            self.local.clear()
+        else:
+            self.local.invalidate_tags(data["tags"])
+
+    def _publish(self, **message):
+        self.client.publish(self._channel, json.dumps({"origin": self._origin, **message}))
+
+    @property
+    def generation(self) -> int:
+        return int(self.client.get(self._generation_key) or 0)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        self._subscribe()
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        generation = self.local.generation
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            return None
+        try:
+            value, tags = _decode_entry(raw)
+        except (ValueError, KeyError, TypeError):
+            # Not an entry this code wrote (e.g. one pickled by an older release): a miss
+            return None
+        self.local.set(key, value, generation=generation, tags=tags)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None,
+            tags: Iterable[str] = ()):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        tags = list(tags)
+        local_generation = self.local.generation
+        with self.client.pipeline() as pipe:
+            # WATCH makes the write fail if any worker invalidated since `generation` was read
+            pipe.watch(self._generation_key)
+            if generation is not None and int(pipe.get(self._generation_key) or 0) != generation:
+                return
+            pipe.multi()
+            pipe.set(self._key(key), _encode_entry(value, tags), px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(self._tag(tag), self._key(key))
+                pipe.expire(self._tag(tag), int(self.ttl) + 1)
+            try:
+                pipe.execute()
+            except WatchError:
+                return
+        self.local.set(key, value, ttl=ttl, generation=local_generation, tags=tags)
+
+    def delete(self, key: Hashable):
+        self.client.pipeline().delete(self._key(key)).incr(self._generation_key).execute()
+        self.local.delete(key)
+        self._publish(key=key)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        tags = list(tags)
+        if not tags:
+            return
+        tag_keys = [self._tag(tag) for tag in tags]
+        keys = set().union(*(self.client.smembers(tag_key) for tag_key in tag_keys))
+        self.client.pipeline().delete(*keys, *tag_keys).incr(self._generation_key).execute()
+        self.local.invalidate_tags(tags)
+        self._publish(tags=tags)
+
+    def clear(self):
+        keys = [
+            key for pattern in (self._key("*"), self._tag("*"))
+            for key in self.client.scan_iter(match=pattern, count=1000)
+        ]
+        pipe = self.client.pipeline()
+        if keys:
+            pipe.delete(*keys)
+        pipe.incr(self._generation_key).execute()
+        self.local.clear()
+        self._publish(tags=None)
+
+    def close(self):
+        with self._lock:
+            if self._subscriber is not None:
+                self._subscriber.stop()
+                self._subscriber = None
+
+    def __len__(self):
+        return len(self.local)
+
+
+def make_cache(namespace: str, maxsize: int, ttl: float, url: str = CACHE_URL):
+    if url.startswith("memory://"):
+        return TTLCache(maxsize, ttl)
+    if url.startswith("fakeredis://"):
+        import fakeredis
+
+        client = fakeredis.FakeRedis(server=_fake_server())
+    else:
+        client = redis_client(url)
+    return RedisCache(client, namespace, maxsize, ttl)
+
+
+def redis_client(url: str):
+    # Fails fast: one immediate retry (for a connection the server dropped), short timeouts
+    import redis
+    from redis.backoff import NoBackoff
+    from redis.retry import Retry
+
+    return redis.Redis.from_url(
+        url,
+        socket_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+        socket_connect_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+        retry=Retry(NoBackoff(), 1),
+    )
+
+
+_fake = None
+
+
+def _fake_server():
+    # One shared fake server per process, so every fakeredis:// cache sees the same data and channels
+    global _fake
+    if _fake is None:
+        import fakeredis
+
+        _fake = fakeredis.FakeServer()
+    return _fake
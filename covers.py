@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import UploadFile
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Book
+from response_cache import books_changed
+from uploads import save_upload
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it covers are only served as uploaded
+    Image = None
+
+# Uploads are stored content-addressed by uploads.save_upload, then resized
+# WebP/JPEG renditions are rendered in a worker pool after the response has gone out.
+# Book.cover_renditions lists the sizes once they exist on disk.
+
+COVER_DIR = "static/book-covers"
+COVER_URL_PREFIX = "/static/book-covers/"
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(5 * 1024 * 1024)))
+# 0 workers renders on a thread instead of a process pool (handy in dev)
+COVER_WORKERS = int(os.getenv("COVER_WORKERS", "1"))
+COVER_WIDTHS = {"thumb": 160, "medium": 480}
+COVER_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+COVER_QUALITY = int(os.getenv("COVER_QUALITY", "80"))
+ALLOWED_EXTENSIONS = ("jpg", "jpeg", "png", "webp")
+
+os.makedirs(COVER_DIR, exist_ok=True)
+logger = logging.getLogger(__name__)
+
+
+def save_cover(upload: UploadFile) -> str:
+    return COVER_URL_PREFIX + save_upload(upload, COVER_DIR, ALLOWED_EXTENSIONS, COVER_MAX_BYTES, "Cover image")
+
+
+def _local_path(cover_url: str | None) -> str | None:
+    # Only covers we stored ourselves have files (and renditions) on disk
+    if cover_url and cover_url.startswith(COVER_URL_PREFIX):
+        return os.path.join(COVER_DIR, cover_url[len(COVER_URL_PREFIX):])
+    return None
+
+
+def _rendition_name(path: str, size: str, ext: str) -> str:
+    return f"{os.path.splitext(path)[0]}-{size}.{ext}"
+
+
+def rendition_urls(cover_url: str | None, sizes: str | None) -> dict | None:
+    if not sizes or not _local_path(cover_url):
+        return None
+    return {
+        size: {ext: _rendition_name(cover_url, size, ext) for ext in COVER_FORMATS}
+        for size in sizes.split(",")
+    }
+
+
+def render_renditions(path: str) -> str:
+    # Runs in the worker pool; returns the sizes written, for Book.cover_renditions
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    for size, width in COVER_WIDTHS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 2), Image.LANCZOS)
+        for ext, fmt in COVER_FORMATS.items():
+            target = _rendition_name(path, size, ext)
+            resized.save(f"{target}.part", fmt, quality=COVER_QUALITY)
+            os.replace(f"{target}.part", target)
+    return ",".join(COVER_WIDTHS)
+
+
+def remove_cover(db: Session, cover_url: str | None):
+    # Files are shared between books with identical covers; only drop unreferenced ones
+    path = _local_path(cover_url)
+    if not path or db.scalar(select(Book.id).where(Book.cover_image_url == cover_url).limit(1)):
+        return
+    for target in [path] + [_rendition_name(path, size, ext) for size in COVER_WIDTHS for ext in COVER_FORMATS]:
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+
+
+class CoverPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers == 0:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="covers")
+                else:
+                    # spawn: never fork a server process that already has threads running
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+            return self._executor
+
+    def submit(self, book_id: int, cover_url: str | None):
+        path = _local_path(cover_url)
+        if Image is None or not path:
+            return None
+        if all(os.path.exists(_rendition_name(path, size, ext)) for size in COVER_WIDTHS for ext in COVER_FORMATS):
+            # Same image as another book: its renditions are already on disk
+            _record(book_id, cover_url, ",".join(COVER_WIDTHS))
+            return None
+        future = self._get_executor().submit(render_renditions, path)
+        future.add_done_callback(lambda done: _rendered(book_id, cover_url, done))
+        return future
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
+
+def _rendered(book_id: int, cover_url: str, future):
+    if future.cancelled():
+        return
+    if future.exception():
+        logger.warning("Rendering cover %s failed: %s", cover_url, future.exception())
+        return
+    _record(book_id, cover_url, future.result())
+
+
+def _record(book_id: int, cover_url: str, sizes: str):
+    # Skipped if the cover was replaced while rendering
+    with SessionLocal() as db:
+        db.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.cover_image_url == cover_url)
+            .values(cover_renditions=sizes)
+            .execution_options(synchronize_session=False)
+        )
+        books_changed(db, [book_id])
+        db.commit()
+
+
+cover_pool = CoverPool(COVER_WORKERS)
+
+
+if __name__ == "__main__":
+    # Backfill renditions for covers uploaded before the pipeline existed
+    with SessionLocal() as session:
+        pending = session.execute(
+            select(Book.id, Book.cover_image_url)
+            .where(Book.cover_renditions.is_(None), Book.cover_image_url.startswith(COVER_URL_PREFIX))
+        ).all()
+    for book_id, cover_url in pending:
+        cover_pool.submit(book_id, cover_url)
+    cover_pool.shutdown(wait=True)
+    print(f"rendered covers for {len(pending)} books")
@@ -1,15 +1,121 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
+from metrics import METRICS_ENABLED, instrument_engine
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./library.db"
+# Point DATABASE_URL at e.g. postgresql+psycopg://... to swap SQLite out
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./library.db")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# Opt-in async stack (requires aiosqlite): USE_ASYNC_DB=1 serves the catalog
+# reads from routers/books_async.py on an AsyncEngine.
+USE_ASYNC_DB = os.getenv("USE_ASYNC_DB", "").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./library.db")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),  # readers don't block on the writer
+    "synchronous": "NORMAL",  # durable with WAL; fsync at checkpoints instead of every commit
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),  # wait for the write lock instead of failing
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),  # negative = KiB per connection
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+
+def _is_sqlite(url) -> bool:
+    return str(url).startswith("sqlite")
+
+
+def _uses_queue_pool(url) -> bool:
+    # In-memory SQLite gets a SingletonThreadPool/StaticPool, which take no sizing options
+    url = make_url(url)
+    return issubclass(url.get_dialect().get_pool_class(url), QueuePool)
+
+
+def _engine_options(url) -> dict:
+    if _is_sqlite(url):
+        if not _uses_queue_pool(url):
+            return {"connect_args": {"check_same_thread": False}}
+        # SQLite connections are just file handles, so the pool may overflow without
+        # bound: a capped pool smaller than the offered load stalls sync routes, whose
+        # finished requests still hold a connection while they wait for a worker
+        # thread to validate the response.
+        return {
+            "connect_args": {"check_same_thread": False},
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "-1")),
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+def _set_sqlite_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def make_engine(url=DATABASE_URL, pragmas: dict | None = SQLITE_PRAGMAS, **kwargs):
+    engine = create_engine(url, **{**_engine_options(url), **kwargs})
+    if _is_sqlite(url) and pragmas:
+        event.listen(engine, "connect", _set_sqlite_pragmas(pragmas))
+    if METRICS_ENABLED:
+        instrument_engine(engine)
+    return engine
+
+
+def make_async_engine(url=ASYNC_DATABASE_URL, pragmas: dict | None = SQLITE_PRAGMAS, **kwargs):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(url, **{**_engine_options(url), **kwargs})
+    if _is_sqlite(url) and pragmas:
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas(pragmas))
+    if METRICS_ENABLED:
+        instrument_engine(engine.sync_engine)
+    return engine
+
+
+def dialect_insert(bind):
+    # INSERT ... ON CONFLICT for the backend in use (SQLite and PostgreSQL share the API)
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
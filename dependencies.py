@@ -1,7 +1,10 @@
+import os
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
+from cache import make_cache
 from database import get_db
 from models import User
 from utils import SECRET_KEY, ALGORITHM
@@ -9,7 +12,27 @@ from schemas import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+# token -> column values of the User it resolves to, tagged "user:<id>"
+auth_cache = make_cache("auth", maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+def _snapshot(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+# Call after committing any change to (or deletion of) a user
+def invalidate_user(user_id: int):
+    auth_cache.invalidate_tags([f"user:{user_id}"])
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    cached = auth_cache.get(token)
+    if cached is not None:
+        # Attach a copy to this request's session without a SELECT
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -23,9 +46,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
+    generation = auth_cache.generation
     user = db.query(User).filter(User.matric_no == token_data.username).first()
     if user is None:
         raise credentials_exception
+    # Never keep a token cached past its own expiry
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    auth_cache.set(token, _snapshot(user), ttl=ttl, generation=generation, tags=[f"user:{user.id}"])
     return user
 
 def get_current_admin(current_user: User = Depends(get_current_user)):
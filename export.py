@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+EXPORT_BATCH_SIZE = 1000
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def _batches(stmt, bind):
+    # Own session on the request's engine: the stream outlives the get_db session
+    db = Session(bind=bind)
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+
+def _ndjson(stmt, bind, columns):
+    for rows in _batches(stmt, bind):
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def _csv(stmt, bind, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in _batches(stmt, bind):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(db: Session, stmt, filename: str, fmt: ExportFormat) -> StreamingResponse:
+    # stmt must select plain columns; rows are written out one batch at a time
+    columns = [column.name for column in stmt.selected_columns]
+    bind = db.get_bind()
+    if fmt == "csv":
+        body, media_type = _csv(stmt, bind, columns), "text/csv"
+    else:
+        body, media_type = _ndjson(stmt, bind, columns), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
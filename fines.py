@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import SessionLocal, dialect_insert
+from models import Fine, Loan
+
+# Overdue loans are materialized into the fines table by a background sweep
+# (started from main.py's lifespan), so /loans/overdue and fine balances are
+# indexed reads instead of a scan of every loan. Returning a book settles its
+# fine at the return date.
+
+FINE_PER_DAY = int(os.getenv("FINE_PER_DAY", "50"))
+FINE_SWEEP_ENABLED = os.getenv("FINE_SWEEP_ENABLED", "1").lower() in ("1", "true", "yes")
+FINE_SWEEP_INTERVAL_SECONDS = int(os.getenv("FINE_SWEEP_INTERVAL_SECONDS", "3600"))
+FINE_SWEEP_BATCH_SIZE = int(os.getenv("FINE_SWEEP_BATCH_SIZE", "5000"))
+
+logger = logging.getLogger(__name__)
+
+
+def fine_for(due_date, on: date | None = None) -> int:
+    on = on or date.today()
+    return max((on - due_date).days, 0) * FINE_PER_DAY if due_date else 0
+
+
+def _upsert(db: Session, rows: list[dict], sweep: bool = False):
+    # A sweep never reopens a fine: its loan may have been returned and settled
+    # after the sweep read it as open
+    stmt = dialect_insert(db.get_bind())(Fine)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Fine.loan_id],
+            set_={column: stmt.excluded[column] for column in ("days_overdue", "amount", "assessed_on", "returned")},
+            where=(Fine.returned == False) if sweep else None,
+        ),
+        rows,
+    )
+
+
+def _row(loan_id, user_id, book_id, due_date, on: date, returned: bool) -> dict:
+    return {
+        "loan_id": loan_id, "user_id": user_id, "book_id": book_id, "due_date": due_date,
+        "days_overdue": (on - due_date).days, "amount": fine_for(due_date, on),
+        "assessed_on": on, "returned": returned,
+    }
+
+
+def settle_fine(db: Session, loan: Loan, on: date | None = None) -> int:
+    # Called in the return transaction: freezes the fine at the return date
+    on = on or date.today()
+    fine = fine_for(loan.due_date, on)
+    if fine:
+        _upsert(db, [_row(loan.id, loan.user_id, loan.book_id, loan.due_date, on, True)])
+    return fine
+
+
+def sweep_batch(db: Session, on: date, after_id: int = 0, batch_size: int = FINE_SWEEP_BATCH_SIZE) -> int | None:
+    # One keyset page of open overdue loans (ix_loans_returned, then by id); returns the last id or None when done
+    loans = db.execute(
+        select(Loan.id, Loan.user_id, Loan.book_id, Loan.due_date)
+        .where(Loan.returned == False, Loan.status == "approved", Loan.due_date < on, Loan.id > after_id)
+        .order_by(Loan.id)
+        .limit(batch_size)
+    ).all()
+    if not loans:
+        return None
+    _upsert(db, [_row(*loan, on, False) for loan in loans], sweep=True)
+    db.commit()
+    return loans[-1].id
+
+
+def sweep_overdue(db: Session, on: date | None = None, batch_size: int = FINE_SWEEP_BATCH_SIZE) -> int:
+    on = on or date.today()
+    batches, after_id = 0, 0
+    while (after_id := sweep_batch(db, on, after_id, batch_size)) is not None:
+        batches += 1
+    return batches
+
+
+async def run_fine_sweeper(interval: int = FINE_SWEEP_INTERVAL_SECONDS):
+    # Fines accrue per day, so sweep once per date; each batch is its own short
+    # transaction on a worker thread, leaving the event loop and the write lock free between them
+    swept_on = None
+    while True:
+        today = date.today()
+        if today != swept_on:
+            try:
+                after_id = 0
+                with SessionLocal() as db:
+                    while (after_id := await asyncio.to_thread(sweep_batch, db, today, after_id)) is not None:
+                        pass
+                swept_on = today
+            except Exception:
+                logger.exception("Fine sweep failed")
+        await asyncio.sleep(interval)
+
+
+def user_fines(db: Session, user_id: int) -> dict:
+    fines = db.scalars(select(Fine).where(Fine.user_id == user_id).order_by(Fine.due_date)).all()
+    return {
+        "user_id": user_id,
+        "balance": sum(fine.amount for fine in fines),
+        "accruing": sum(fine.amount for fine in fines if not fine.returned),
+        "fines": [
+            {
+                "loan_id": fine.loan_id, "book_id": fine.book_id, "due_date": fine.due_date,
+                "days_overdue": fine.days_overdue, "amount": fine.amount,
+                "assessed_on": fine.assessed_on, "returned": fine.returned,
+            }
+            for fine in fines
+        ],
+    }
+
+
+if __name__ == "__main__":
+    with SessionLocal() as session:
+        print(f"{sweep_overdue(session)} batches swept")
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+from availability import release_copy, take_copy
+from models import HoldRequest, Loan
+from stats import loans_started
+
+# Holds form a FIFO queue per book, ordered by (request_date, id) on
+# ix_hold_requests_book_queue. A return hands the released copy straight to
+# the head of the queue, inside the return transaction.
+
+
+def queue(book_id: int):
+    return select(HoldRequest).where(HoldRequest.book_id == book_id).order_by(HoldRequest.request_date, HoldRequest.id)
+
+
+def promote_next_hold(db: Session, book_id: int) -> Loan | None:
+    # Call right after release_copy. SKIP LOCKED lets concurrent returns on
+    # PostgreSQL promote different holders; SQLite serializes them on the write lock.
+    hold = db.scalars(queue(book_id).limit(1).with_for_update(skip_locked=True)).first()
+    if not hold or not take_copy(db, book_id):
+        return None
+    claimed = db.execute(
+        delete(HoldRequest).where(HoldRequest.id == hold.id).execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        release_copy(db, book_id)
+        return None
+
+    loan = Loan(
+        user_id=hold.user_id,
+        book_id=book_id,
+        request_date=hold.request_date,
+        borrowed_on=date.today(),
+        due_date=date.today() + timedelta(days=14),
+        status="approved",
+        returned=False
+    )
+    db.add(loan)
+    loans_started(db, [(book_id, loan.due_date)], from_pending=False)
+    return loan
+
+
+def queue_position(db: Session, user_id: int, book_id: int) -> dict | None:
+    hold = db.scalars(select(HoldRequest).where(HoldRequest.user_id == user_id, HoldRequest.book_id == book_id)).first()
+    if not hold:
+        return None
+    in_queue = select(func.count(HoldRequest.id)).where(HoldRequest.book_id == book_id)
+    ahead = db.scalar(in_queue.where(tuple_(HoldRequest.request_date, HoldRequest.id) < (hold.request_date, hold.id)))
+    return {
+        "book_id": book_id,
+        "request_date": hold.request_date,
+        "position": ahead + 1,
+        "queue_length": db.scalar(in_queue),
+    }
@@ -0,0 +1,39 @@
+from typing import Optional
+from fastapi import Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import Book, Loan
+
+# Loan listings as one joined projection of exactly the LoanOutExtended
+# columns, newest first, keyset-paginated on loan id (ix_loans_user_history
+# for one user's history). The cursor for the next page is sent in X-Next-Cursor.
+
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+
+def loan_history_select(user_id: Optional[int], cursor: Optional[int], limit: int):
+    stmt = (
+        select(
+            Loan.id, Loan.book_id,
+            # Loans outlive deleted books
+            func.coalesce(Book.title, "").label("book_title"),
+            Loan.borrowed_on, Loan.due_date, Loan.return_date, Loan.status,
+        )
+        .outerjoin(Book, Book.id == Loan.book_id)
+        .order_by(Loan.id.desc())
+        .limit(limit + 1)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Loan.user_id == user_id)
+    if cursor is not None:
+        stmt = stmt.where(Loan.id < cursor)
+    return stmt
+
+
+def loan_history(db: Session, response: Response, user_id: Optional[int], cursor: Optional[int], limit: int) -> list[dict]:
+    rows = db.execute(loan_history_select(user_id, cursor, limit)).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return [dict(row) for row in rows]
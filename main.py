@@ -1,28 +1,68 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from database import Base, engine
+from database import engine, USE_ASYNC_DB, async_engine
+from migrate import upgrade_database
+from hashing import password_pool
+from covers import cover_pool
+from fines import FINE_SWEEP_ENABLED, run_fine_sweeper
+from search import setup_search
 from routers import books, users, loans, dashboard, auth
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from uploads import CachedStaticFiles
+from response_cache import RESPONSE_CACHE_ENABLED, ResponseCacheMiddleware, response_cache
+from dependencies import auth_cache
+from metrics import METRICS_ENABLED, MetricsMiddleware, metrics_endpoint
+from compression import CompressionMiddleware
 
 
 
-Base.metadata.create_all(bind=engine)
+upgrade_database(engine)
+setup_search(engine)
 
 
-app = FastAPI(title="Library Management API (Secure)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(run_fine_sweeper()) if FINE_SWEEP_ENABLED else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    password_pool.shutdown()
+    cover_pool.shutdown()
+    auth_cache.close()
+    response_cache.close()
+    if async_engine is not None:
+        await async_engine.dispose()
 
+
+app = FastAPI(title="Library Management API (Secure)", lifespan=lifespan)
+
+# Added before CORS so cached responses still pass through it; the cache keeps
+# bodies uncompressed and compression is applied per client
+if RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specify frontend origins like ["http://localhost:5500"]
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Outermost, so its timings include cache hits and CORS
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
+if USE_ASYNC_DB:
+    from routers import books_async
+    app.include_router(books_async.router, prefix="/books", tags=["Books"])
 app.include_router(books.router, prefix="/books", tags=["Books"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(loans.router, prefix="/loans", tags=["Loans"])
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from sqlalchemy import event
+from starlette.responses import PlainTextResponse
+
+# Opt-in request instrumentation (METRICS_ENABLED=1): MetricsMiddleware times
+# every request and the engine hooks count its SQL statements. Per-route
+# histograms are served in Prometheus text format at /metrics, each response
+# gets a Server-Timing header, and statements slower than SLOW_QUERY_MS are
+# logged and kept as samples. Disabled, nothing is registered at all.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_SAMPLES = int(os.getenv("SLOW_QUERY_SAMPLES", "100"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+logger = logging.getLogger(__name__)
+
+# [statements, seconds in the database, scope] of the request being served; sync
+# routes run in a threadpool that copies the context, so they update the same list
+_current = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.series = {}
+
+    def observe(self, values: tuple, value: float):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.series.items()):
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"), LATENCY_BUCKETS
+        )
+        self.queries = Histogram(
+            "http_request_db_queries", "SQL statements issued per request.", ("method", "route"), QUERY_COUNT_BUCKETS
+        )
+        self.db_time = Histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per request.", ("method", "route"), LATENCY_BUCKETS
+        )
+        self.slow_queries = deque(maxlen=SLOW_QUERY_SAMPLES)
+        self.slow_total = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, queries: int, db_seconds: float):
+        with self._lock:
+            self.duration.observe((method, route, str(status)), seconds)
+            self.queries.observe((method, route), queries)
+            self.db_time.observe((method, route), db_seconds)
+
+    def record_slow_query(self, statement: str, seconds: float, route: str | None):
+        sample = {
+            "route": route,
+            "ms": round(seconds * 1000, 2),
+            "statement": " ".join(statement.split())[:1000],
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.slow_total += 1
+            self.slow_queries.append(sample)
+        logger.warning("Slow query (%.1f ms) on %s: %s", sample["ms"], route, sample["statement"])
+
+    def slow_query_samples(self) -> list[dict]:
+        # Most recent first; copied under the lock the engine hooks append with
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+    def render(self) -> str:
+        with self._lock:
+            lines = self.duration.render() + self.queries.render() + self.db_time.render()
+            lines += [
+                "# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_total}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def route_label(scope) -> str:
+    # Route template, e.g. /books/{book_id}; answers served before routing (response cache hits) carry it in scope
+    if "library.route" in scope:
+        return scope["library.route"]
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(scope["path"]):
+        # Routes of an included router keep their own path; take the prefix from the request path
+        request_path = scope["path"]
+        for slash in reversed([i for i, c in enumerate(request_path) if c == "/"]):
+            if regex.match(request_path[slash:]):
+                return request_path[:slash] + path
+    return path
+
+
+def instrument_engine(engine):
+    # before/after_cursor_execute around every statement, attributed to the current request
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        current = _current.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            registry.record_slow_query(statement, elapsed, route_label(current[2]) if current is not None else None)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        current = [0, 0.0, scope]
+        token = _current.set(current)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (
+                    f'app;dur={(time.perf_counter() - start) * 1000:.2f}, '
+                    f'db;dur={current[1] * 1000:.2f};desc="{current[0]} queries"'
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            registry.record_request(
+                scope["method"], route_label(scope), status, time.perf_counter() - start, current[0], current[1]
+            )
+
+
+def metrics_endpoint(request):
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
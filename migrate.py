@@ -0,0 +1,59 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData, create_engine, inspect, text
+from database import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# Revision whose schema matches what Base.metadata.create_all() used to build
+LEGACY_REVISION = "0001"
+
+
+def _config(connection) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def _complete_legacy_schema(connection):
+    # create_all() never altered existing tables, so an old library.db can predate
+    # columns (and tables) of LEGACY_REVISION. Build that revision in memory and add
+    # whatever is missing; added columns are nullable, as SQLite requires.
+    with create_engine("sqlite://").begin() as reference:
+        command.upgrade(_config(reference), LEGACY_REVISION)
+        expected = MetaData()
+        expected.reflect(bind=reference)
+    existing = inspect(connection)
+    tables = existing.get_table_names()
+    for table in expected.sorted_tables:
+        if table.name == "alembic_version":
+            continue
+        if table.name not in tables:
+            table.create(connection)
+            continue
+        columns = {column["name"] for column in existing.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+        indexes = {index["name"] for index in existing.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+
+
+def upgrade_database(bind=engine, revision: str = "head"):
+    with bind.begin() as connection:
+        config = _config(connection)
+        tables = inspect(connection).get_table_names()
+        if "books" in tables and "alembic_version" not in tables:
+            # A library.db created before migrations existed: adopt it as the baseline
+            _complete_legacy_schema(connection)
+            command.stamp(config, LEGACY_REVISION)
+        command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    upgrade_database()
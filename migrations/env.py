@@ -0,0 +1,36 @@
+from alembic import context
+from database import Base, engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # The FTS5 search tables are managed by search.setup_search(), not the models
+    return not (type_ == "table" and name.startswith("books_fts"))
+
+
+def run_migrations_online():
+    # migrate.upgrade_database() hands us its connection; `alembic upgrade` uses the app engine
+    connection = context.config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+def run_migrations_offline():
+    context.configure(url=str(engine.url), target_metadata=target_metadata, include_object=include_object, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,68 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "books",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("author", sa.String(), nullable=False),
+        sa.Column("isbn", sa.String(), nullable=False, unique=True),
+        sa.Column("quantity", sa.Integer()),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("category", sa.String(), nullable=True),
+        sa.Column("cover_image_url", sa.String(), nullable=True),
+    )
+    op.create_index("ix_books_id", "books", ["id"])
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("matric_no", sa.String(), nullable=False),
+        sa.Column("department", sa.String(), nullable=False),
+        sa.Column("role", sa.String()),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("profile_picture_url", sa.String(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_matric_no", "users", ["matric_no"], unique=True)
+    op.create_table(
+        "loans",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("books.id")),
+        sa.Column("borrowed_on", sa.Date()),
+        sa.Column("due_date", sa.Date()),
+        sa.Column("returned", sa.Boolean()),
+        sa.Column("status", sa.String()),
+        sa.Column("request_date", sa.Date()),
+        sa.Column("return_date", sa.Date(), nullable=True),
+    )
+    op.create_index("ix_loans_id", "loans", ["id"])
+    op.create_table(
+        "hold_requests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("books.id")),
+        sa.Column("request_date", sa.Date()),
+    )
+    op.create_index("ix_hold_requests_id", "hold_requests", ["id"])
+
+
+def downgrade():
+    op.drop_table("hold_requests")
+    op.drop_table("loans")
+    op.drop_table("users")
+    op.drop_table("books")
@@ -0,0 +1,40 @@
+"""indexes for the catalog, loan and hold hot paths
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases first built by create_all() may already have the books indexes
+    op.create_index("ix_books_title_id", "books", ["title", "id"], if_not_exists=True)
+    op.create_index("ix_books_category_id", "books", ["category", "id"], if_not_exists=True)
+    op.create_index("ix_books_author_id", "books", ["author", "id"], if_not_exists=True)
+
+    op.create_index("ix_loans_book_status_returned", "loans", ["book_id", "status", "returned"])
+    op.create_index("ix_loans_user_returned", "loans", ["user_id", "returned"])
+    op.create_index("ix_loans_returned", "loans", ["returned"])
+
+    # Keep the oldest hold when a user double-booked before the constraint existed
+    op.execute(
+        "DELETE FROM hold_requests WHERE id NOT IN "
+        "(SELECT MIN(id) FROM hold_requests GROUP BY user_id, book_id)"
+    )
+    op.create_index("uq_hold_requests_user_book", "hold_requests", ["user_id", "book_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_hold_requests_user_book", "hold_requests")
+    op.drop_index("ix_loans_returned", "loans")
+    op.drop_index("ix_loans_user_returned", "loans")
+    op.drop_index("ix_loans_book_status_returned", "loans")
+    op.drop_index("ix_books_author_id", "books")
+    op.drop_index("ix_books_category_id", "books")
+    op.drop_index("ix_books_title_id", "books")
@@ -0,0 +1,28 @@
+"""maintained available_count on books
+
+Revision ID: 0003
+Revises: 0002
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("books", sa.Column("available_count", sa.Integer(), nullable=False, server_default="0"))
+    # Start from the availability GET /books reported before the counter existed
+    op.execute(
+        "UPDATE books SET available_count = MAX(COALESCE(quantity, 0) - ("
+        "SELECT COUNT(*) FROM loans WHERE loans.book_id = books.id "
+        "AND loans.status = 'approved' AND loans.returned = 0), 0)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_column("available_count")
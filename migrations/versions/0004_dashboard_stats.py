@@ -0,0 +1,42 @@
+"""dashboard_stats counters
+
+Revision ID: 0004
+Revises: 0003
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+ACTIVE = "loans.status = 'approved' AND loans.returned = 0"
+
+
+def upgrade():
+    op.create_table(
+        "dashboard_stats",
+        sa.Column("metric", sa.String(), primary_key=True),
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_dashboard_stats_metric_value", "dashboard_stats", ["metric", "value"])
+    # Same counters as stats.rebuild_stats
+    for select in (
+        "SELECT 'loans', CASE status WHEN 'approved' THEN 'active' ELSE status END, COUNT(*) FROM loans "
+        "WHERE loans.returned = 0 AND status IN ('pending', 'approved') GROUP BY status",
+        f"SELECT 'due', COALESCE(CAST(due_date AS TEXT), ''), COUNT(*) FROM loans WHERE {ACTIVE} GROUP BY due_date",
+        "SELECT 'copies', COALESCE(category, ''), SUM(COALESCE(quantity, 0)) FROM books GROUP BY category",
+        "SELECT 'on_loan', COALESCE(books.category, ''), COUNT(*) FROM books "
+        f"JOIN loans ON loans.book_id = books.id WHERE {ACTIVE} GROUP BY books.category",
+        "SELECT 'borrowed', COALESCE(CAST(book_id AS TEXT), ''), COUNT(*) FROM loans WHERE status = 'approved' GROUP BY book_id",
+    ):
+        op.execute(f"INSERT INTO dashboard_stats (metric, key, value) {select}")
+    op.execute("DELETE FROM dashboard_stats WHERE value = 0")
+
+
+def downgrade():
+    op.drop_index("ix_dashboard_stats_metric_value", table_name="dashboard_stats")
+    op.drop_table("dashboard_stats")
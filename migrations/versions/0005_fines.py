@@ -0,0 +1,36 @@
+"""fines materialized by the overdue sweep
+
+Revision ID: 0005
+Revises: 0004
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by the first sweep after startup (fines.run_fine_sweeper)
+    op.create_table(
+        "fines",
+        sa.Column("loan_id", sa.Integer(), sa.ForeignKey("loans.id"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("books.id")),
+        sa.Column("due_date", sa.Date(), nullable=False),
+        sa.Column("days_overdue", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("assessed_on", sa.Date(), nullable=False),
+        sa.Column("returned", sa.Boolean(), nullable=False),
+    )
+    op.create_index("ix_fines_user_returned", "fines", ["user_id", "returned"])
+    op.create_index("ix_fines_returned_due", "fines", ["returned", "due_date", "loan_id"])
+
+
+def downgrade():
+    op.drop_index("ix_fines_returned_due", table_name="fines")
+    op.drop_index("ix_fines_user_returned", table_name="fines")
+    op.drop_table("fines")
@@ -0,0 +1,20 @@
+"""FIFO hold queue index
+
+Revision ID: 0006
+Revises: 0005
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_hold_requests_book_queue", "hold_requests", ["book_id", "request_date", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_hold_requests_book_queue", table_name="hold_requests")
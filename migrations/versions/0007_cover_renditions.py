@@ -0,0 +1,23 @@
+"""cover rendition sizes on books
+
+Revision ID: 0007
+Revises: 0006
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing covers get renditions from `python covers.py`
+    op.add_column("books", sa.Column("cover_renditions", sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_column("cover_renditions")
@@ -0,0 +1,20 @@
+"""Loan history index
+
+Revision ID: 0008
+Revises: 0007
+"""
+from alembic import op
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_loans_user_history", "loans", ["user_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_loans_user_history", table_name="loans")
@@ -0,0 +1,36 @@
+"""One pending loan request per user and book
+
+Revision ID: 0009
+Revises: 0008
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+DUPLICATES = (
+    "status = 'pending' AND id NOT IN "
+    "(SELECT MIN(id) FROM loans WHERE status = 'pending' GROUP BY user_id, book_id)"
+)
+
+
+def upgrade():
+    # Keep the oldest of any duplicate requests; the rest are rejected, as an admin would
+    duplicates = op.get_bind().scalar(sa.text(f"SELECT COUNT(*) FROM loans WHERE {DUPLICATES}"))
+    if duplicates:
+        op.execute(f"UPDATE loans SET status = 'rejected' WHERE {DUPLICATES}")
+        op.execute(
+            f"UPDATE dashboard_stats SET value = value - {duplicates} WHERE metric = 'loans' AND key = 'pending'"
+        )
+    op.create_index(
+        "ux_loans_pending_user_book", "loans", ["user_id", "book_id"], unique=True,
+        sqlite_where=sa.text("status = 'pending'"), postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ux_loans_pending_user_book", table_name="loans")
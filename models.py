@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,10 +12,21 @@ class Book(Base):
     author = Column(String, nullable=False)
     isbn = Column(String, unique=True, nullable=False)
     quantity = Column(Integer, default=1)
+    # Copies on the shelf, maintained by availability.py alongside loan state changes
+    available_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     description = Column(String, nullable=True)
     category = Column(String, nullable=True)
     cover_image_url = Column(String, nullable=True)
+    # Comma-separated rendition sizes written by covers.py, NULL until rendered
+    cover_renditions = Column(String, nullable=True)
+
+    # Keyset pagination: each filtered/sorted page of /books is an index range scan
+    __table_args__ = (
+        Index("ix_books_title_id", "title", "id"),
+        Index("ix_books_category_id", "category", "id"),
+        Index("ix_books_author_id", "author", "id"),
+    )
 
 
 class User(Base):
@@ -42,6 +53,19 @@ class Loan(Base):
     user = relationship("User")
     book = relationship("Book")
 
+    # Shaped after the hot filters: availability/holds, a user's open loans, a user's
+    # history newest first, all open loans; at most one pending request per user and book
+    __table_args__ = (
+        Index("ix_loans_book_status_returned", "book_id", "status", "returned"),
+        Index("ix_loans_user_returned", "user_id", "returned"),
+        Index("ix_loans_user_history", "user_id", "id"),
+        Index("ix_loans_returned", "returned"),
+        Index(
+            "ux_loans_pending_user_book", "user_id", "book_id", unique=True,
+            sqlite_where=text("status = 'pending'"), postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
 
 class HoldRequest(Base):
     __tablename__ = "hold_requests"
@@ -52,3 +76,39 @@ class HoldRequest(Base):
 
     user = relationship("User")
     book = relationship("Book")
+
+    __table_args__ = (
+        Index("uq_hold_requests_user_book", "user_id", "book_id", unique=True),
+        # FIFO queue per book, see holds.py
+        Index("ix_hold_requests_book_queue", "book_id", "request_date", "id"),
+    )
+
+
+class Fine(Base):
+    # Late fees accrued per overdue loan; refreshed by the fines.py sweep, final once returned
+    __tablename__ = "fines"
+    loan_id = Column(Integer, ForeignKey("loans.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"))
+    due_date = Column(Date, nullable=False)
+    days_overdue = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+    assessed_on = Column(Date, nullable=False)
+    returned = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_fines_user_returned", "user_id", "returned"),
+        Index("ix_fines_returned_due", "returned", "due_date", "loan_id"),
+    )
+
+
+class DashboardStat(Base):
+    # Counters behind /dashboard/stats, bumped by stats.py on every loan state change
+    __tablename__ = "dashboard_stats"
+    metric = Column(String, primary_key=True)
+    key = Column(String, primary_key=True, default="")
+    value = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_dashboard_stats_metric_value", "metric", "value"),
+    )
@@ -0,0 +1,237 @@
+import ipaddress
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from cache import CACHE_ERRORS, CACHE_URL, redis_client
+
+# Token buckets for the auth and loan-request endpoints, keyed by client IP
+# and by matric number, plus a cap on how many of those expensive requests
+# run at once. Both answer 429 with Retry-After. RATE_LIMIT_URL (CACHE_URL by
+# default) picks the bucket store: memory:// per process, redis:// shared by
+# every worker, fakeredis:// in-process. While that store is unreachable the
+# bucket limits are skipped (logged) rather than failing logins with a 500; the
+# concurrency cap is in-process and keeps holding.
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", CACHE_URL)
+RATE_LIMIT_BUCKETS = int(os.getenv("RATE_LIMIT_BUCKETS", "100000"))
+# "<requests>/<seconds>": bursts of up to <requests>, refilled evenly over <seconds>
+LOGIN_IP_RATE = os.getenv("LOGIN_IP_RATE", "30/60")
+LOGIN_ACCOUNT_RATE = os.getenv("LOGIN_ACCOUNT_RATE", "10/60")
+REGISTER_IP_RATE = os.getenv("REGISTER_IP_RATE", "10/60")
+LOAN_REQUEST_IP_RATE = os.getenv("LOAN_REQUEST_IP_RATE", "60/60")
+LOAN_REQUEST_ACCOUNT_RATE = os.getenv("LOAN_REQUEST_ACCOUNT_RATE", "20/60")
+EXPENSIVE_CONCURRENCY_LIMIT = int(os.getenv("EXPENSIVE_CONCURRENCY_LIMIT", "64"))
+EXPENSIVE_RETRY_AFTER_SECONDS = int(os.getenv("EXPENSIVE_RETRY_AFTER_SECONDS", "1"))
+# After a bucket store error, checks are skipped for this long instead of each waiting on a timeout
+RATE_LIMIT_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_RETRY_SECONDS", "5"))
+# Comma-separated addresses/CIDRs of the reverse proxies in front of the app.
+# X-Forwarded-For is only read when the peer is one of them, and then only up to
+# the rightmost hop they didn't add: every entry left of it is client-supplied.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+]
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    requests, seconds = rate.split("/")
+    return int(requests), float(seconds)
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBuckets:
+    # key -> (tokens, updated); least recently used buckets are dropped past maxsize
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, per_second: float) -> float:
+        # Takes a token; returns 0, or the seconds until one is available
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * per_second)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Same bucket as TokenBuckets.take, run atomically in Redis on the server's clock
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * per_second)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / per_second
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / per_second * 1000))
+return tostring(wait)
+"""
+
+
+class RedisTokenBuckets:
+    # Every take is a round trip; async callers go through RateLimit.acheck
+    blocking = True
+
+    def __init__(self, client, namespace: str = "ratelimit"):
+        self.client = client
+        self.namespace = namespace
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: int, per_second: float) -> float:
+        return float(self._take(keys=[f"{self.namespace}:{key}"], args=[capacity, per_second]))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.namespace}:*", count=1000))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_buckets(url: str = RATE_LIMIT_URL, maxsize: int = RATE_LIMIT_BUCKETS):
+    if url.startswith("memory://"):
+        return TokenBuckets(maxsize)
+    if url.startswith("fakeredis://"):
+        import fakeredis
+        from cache import _fake_server
+
+        return RedisTokenBuckets(fakeredis.FakeRedis(server=_fake_server()))
+    return RedisTokenBuckets(redis_client(url))
+
+
+buckets = make_buckets()
+_unavailable_until = 0.0
+
+
+class RateLimit:
+    def __init__(self, name: str, rate: str):
+        self.name = name
+        self.rate = rate
+        self.capacity, seconds = parse_rate(rate)
+        self.per_second = self.capacity / seconds
+        self.rejected = 0
+        self.errors = 0
+
+    def check(self, key: str):
+        global _unavailable_until
+        if not RATE_LIMIT_ENABLED or time.monotonic() < _unavailable_until:
+            return
+        try:
+            wait = buckets.take(f"{self.name}:{key}", self.capacity, self.per_second)
+        except CACHE_ERRORS as exc:
+            self.errors += 1
+            _unavailable_until = time.monotonic() + RATE_LIMIT_RETRY_SECONDS
+            logger.warning("Rate limits skipped for %ss, bucket store unavailable: %s", RATE_LIMIT_RETRY_SECONDS, exc)
+            return
+        if wait:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    async def acheck(self, key: str):
+        # check() for async routes: Redis round trips run in the threadpool, not on the event loop
+        if buckets.blocking:
+            await run_in_threadpool(self.check, key)
+        else:
+            self.check(key)
+
+
+def _trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    # The peer address, or behind TRUSTED_PROXIES the address the outermost of
+    # them saw; uvicorn's own proxy-header handling must stay off (see render.yaml)
+    host = request.client.host if request.client else "unknown"
+    if not _trusted_proxy(host):
+        return host
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else host
+
+
+class ConcurrencyLimit:
+    # FastAPI dependency holding one of `limit` slots for the whole request. It
+    # runs on the event loop, so the counter needs no lock.
+    def __init__(self, limit: int, retry_after: int):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+login_ip_limit = RateLimit("login-ip", LOGIN_IP_RATE)
+login_account_limit = RateLimit("login-account", LOGIN_ACCOUNT_RATE)
+register_ip_limit = RateLimit("register-ip", REGISTER_IP_RATE)
+loan_request_ip_limit = RateLimit("loan-request-ip", LOAN_REQUEST_IP_RATE)
+loan_request_account_limit = RateLimit("loan-request-account", LOAN_REQUEST_ACCOUNT_RATE)
+LIMITS = (login_ip_limit, login_account_limit, register_ip_limit, loan_request_ip_limit, loan_request_account_limit)
+
+# Login, registration and loan requests
+expensive_routes = ConcurrencyLimit(EXPENSIVE_CONCURRENCY_LIMIT, EXPENSIVE_RETRY_AFTER_SECONDS)
+
+
+def rate_limit_stats() -> dict:
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "limits": {limit.name: {"rate": limit.rate, "rejected": limit.rejected, "errors": limit.errors} for limit in LIMITS},
+        "concurrency": {
+            "limit": expensive_routes.limit,
+            "in_flight": expensive_routes.in_flight,
+            "rejected": expensive_routes.rejected,
+        },
+    }
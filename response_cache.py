@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from functools import partial
+from urllib.parse import parse_qsl, urlencode
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from cache import CACHE_ERRORS, make_cache
+from metrics import route_label
+
+# Serialized responses of the public catalog reads, keyed by path + query and
+# tagged with the book ids they contain. Writers call books_changed() inside
+# their transaction; the matching entries are dropped once it commits, so a
+# loan on one book only evicts the pages showing that book. With a Redis
+# CACHE_URL the entries and their invalidation are shared by all workers;
+# while Redis is unreachable requests are served uncached.
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+# After a backend error, requests skip the cache this long instead of each waiting on Redis
+RESPONSE_CACHE_RETRY_SECONDS = float(os.getenv("RESPONSE_CACHE_RETRY_SECONDS", "5"))
+# GET /books, /books/search and /books/{id}; not /books/{id}/hold, which is per user
+CACHEABLE_PATH = re.compile(r"^/books(/|/search|/\d+)?$")
+
+response_cache = make_cache("responses", RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(response_cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+            }
+
+
+cache_stats = CacheStats()
+
+
+def books_changed(db: Session, book_ids=(), catalog: bool = False):
+    # catalog=True when membership or order of listings may change (create, delete, edits, imports)
+    pending = db.info.setdefault("response_cache", {"books": set(), "catalog": False})
+    pending["books"].update(book_ids)
+    pending["catalog"] |= catalog
+
+
+def invalidate(book_ids=(), catalog: bool = False):
+    cache_stats.count("invalidations")
+    try:
+        if catalog:
+            response_cache.clear()
+        elif book_ids:
+            response_cache.invalidate_tags([f"book:{book_id}" for book_id in book_ids])
+    except CACHE_ERRORS:
+        # The write is already committed; stale entries expire with their TTL
+        cache_stats.count("errors")
+        logger.exception("Response cache invalidation failed")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    pending = session.info.pop("response_cache", None)
+    if pending:
+        invalidate(pending["books"], pending["catalog"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("response_cache", None)
+
+
+def _cache_key(scope) -> str:
+    query = sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+    return scope["path"].rstrip("/") + "?" + urlencode(query)
+
+
+def _book_tags(body: bytes) -> list[str]:
+    data = json.loads(body)
+    items = data if isinstance(data, list) else [data]
+    return [f"book:{item['id']}" for item in items if isinstance(item, dict) and "id" in item]
+
+
+class _Unavailable(Exception):
+    pass
+
+
+_unavailable_until = 0.0
+
+
+async def _cache_call(fn, *args, **kwargs):
+    # Redis round trips run in the threadpool, never on the event loop; a
+    # backend error becomes _Unavailable so the request goes on uncached
+    global _unavailable_until
+    if time.monotonic() < _unavailable_until:
+        raise _Unavailable
+    try:
+        if response_cache.blocking:
+            return await run_in_threadpool(partial(fn, *args, **kwargs))
+        return fn(*args, **kwargs)
+    except CACHE_ERRORS as exc:
+        cache_stats.count("errors")
+        _unavailable_until = time.monotonic() + RESPONSE_CACHE_RETRY_SECONDS
+        logger.warning("Response cache unavailable for %ss: %s", RESPONSE_CACHE_RETRY_SECONDS, exc)
+        raise _Unavailable from exc
+
+
+def _generation():
+    return response_cache.generation
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not CACHEABLE_PATH.match(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        key = _cache_key(scope)
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        try:
+            entry = await _cache_call(response_cache.get, key)
+            # Read before the response is built, see TTLCache.set
+            generation = None if entry is not None else await _cache_call(_generation)
+        except _Unavailable:
+            return await self.app(scope, receive, send)
+        if entry is not None:
+            cache_stats.count("hits")
+            scope["library.route"] = entry["route"]
+            return await self._respond(send, entry, if_none_match, b"HIT")
+        cache_stats.count("misses")
+
+        # Buffer the (small, JSON) response so it can be hashed and stored
+        start, chunks = {}, []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        if start.get("status") != 200:
+            await send(start)
+            return await send({"type": "http.response.body", "body": body})
+
+        headers = [(k, v) for k, v in start["headers"] if k.lower() not in (b"content-length", b"etag")]
+        entry = {
+            "headers": headers,
+            "body": body,
+            "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"'.encode(),
+            "route": route_label(scope),
+        }
+        try:
+            await _cache_call(response_cache.set, key, entry, generation=generation, tags=_book_tags(body))
+        except _Unavailable:
+            pass
+        await self._respond(send, entry, if_none_match, b"MISS")
+
+    async def _respond(self, send, entry, if_none_match, status: bytes):
+        headers = [
+            (b"etag", entry["etag"]),
+            (b"cache-control", b"no-cache"),  # clients revalidate, and get a 304 while unchanged
+            (b"x-cache", status),
+        ]
+        if if_none_match and entry["etag"].decode() in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            cache_stats.count("not_modified")
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            return await send({"type": "http.response.body", "body": b""})
+        headers += entry["headers"] + [(b"content-length", str(len(entry["body"])).encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": entry["body"]})
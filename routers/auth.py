@@ -1,24 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from database import get_db
 from models import User
-from utils import verify_password, get_password_hash, create_access_token
+from utils import create_access_token
+from hashing import hash_password, check_password, password_pool
+from dependencies import get_current_admin
 from schemas import UserCreate, Token
+from rate_limit import client_ip, expensive_routes, login_account_limit, login_ip_limit, register_ip_limit
 
 router = APIRouter()
 
 ADMIN_CODE = "SUPERADMIN123"
 
-@router.post("/register", response_model=Token, summary="Register user (student/admin)")
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.matric_no == user_in.matric_no).first():
+# Register/login are async so bcrypt can be awaited on the hashing pool; their
+# DB work runs in the threadpool and never holds a pooled connection across a hash.
+# Rate limits are checked first, so throttled attempts cost no query and no hash.
+def find_user(db: Session, matric_no: str):
+    user = db.query(User).filter(User.matric_no == matric_no).first()
+    db.close()
+    return user
+
+def save_user(db: Session, user: User):
+    db.add(user)
+    db.commit()
+
+@router.post("/register", response_model=Token, summary="Register user (student/admin)",
+             dependencies=[Depends(expensive_routes)])
+async def register(request: Request, user_in: UserCreate, db: Session = Depends(get_db)):
+    await register_ip_limit.acheck(client_ip(request))
+    if await run_in_threadpool(find_user, db, user_in.matric_no):
         raise HTTPException(status_code=400, detail="Matric number already registered")
     role = user_in.role or "student"
     if role == "admin":
         if user_in.admin_code != ADMIN_CODE:
             raise HTTPException(status_code=403, detail="Invalid admin code")
-    hashed_pwd = get_password_hash(user_in.password)
+    hashed_pwd = await hash_password(user_in.password)
     user = User(
         name=user_in.name,
         matric_no=user_in.matric_no,
@@ -26,21 +44,28 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
         role=role,
         hashed_password=hashed_pwd
     )
-    db.add(user)
-    db.commit()
-    access_token = create_access_token({"sub": user.matric_no})
+    await run_in_threadpool(save_user, db, user)
+    access_token = create_access_token({"sub": user_in.matric_no})
     return Token(access_token=access_token)
 
 
-@router.post("/login", response_model=Token, summary="Login and get JWT token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.matric_no == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+@router.post("/login", response_model=Token, summary="Login and get JWT token",
+             dependencies=[Depends(expensive_routes)])
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    await login_ip_limit.acheck(client_ip(request))
+    await login_account_limit.acheck(form_data.username)
+    user = await run_in_threadpool(find_user, db, form_data.username)
+    if not user or not await check_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect credentials")
     access_token = create_access_token({"sub": user.matric_no})
     return Token(access_token=access_token)
 
 
+@router.get("/hashing-pool", dependencies=[Depends(get_current_admin)])
+def get_hashing_pool_stats():
+    return password_pool.stats()
+
+
 @router.post("/forgot-password")
 def forgot_password(email: str):
     # Placeholder: send reset email logic
@@ -1,20 +1,30 @@
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import select, tuple_, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Book, Loan, HoldRequest, User
+from models import Book, HoldRequest, User
 from schemas import Book as BookSchema
 from dependencies import get_current_user, get_current_admin
-from typing import List
+from search import RANK, books_fts, to_match_query
+from availability import set_quantity
+from book_import import ImportFormat, import_books
+from stats import book_changed
+from holds import queue_position
+from response_cache import books_changed
+from covers import cover_pool, remove_cover, rendition_urls, save_cover
+from serialization import json_response
+from typing import List, Literal, Optional
 from datetime import date
-import os
-from uuid import uuid4
-from shutil import copyfileobj
+import base64
+import json
 
 router = APIRouter()
 
-UPLOAD_DIR = "static/book-covers"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_SEARCH_RESULTS = 50
 
 @router.post("/{book_id}/hold")
 def place_hold(
@@ -29,15 +39,7 @@ def place_hold(
     if not book:
         raise HTTPException(status_code=404, detail="Book not found.")
 
-    active_loans = db.query(Loan).filter(
-        Loan.book_id == book_id,
-        Loan.status == "approved",
-        Loan.returned == False
-    ).count()
-
-    available_quantity = book.quantity - active_loans
-
-    if available_quantity > 0:
+    if book.available_count > 0:
         raise HTTPException(status_code=400, detail="Book is currently available. No need to hold.")
 
     existing_hold = db.query(HoldRequest).filter_by(user_id=current_user.id, book_id=book_id).first()
@@ -50,52 +52,136 @@ def place_hold(
         request_date=date.today()
     )
     db.add(hold)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request won the race for (user_id, book_id)
+        db.rollback()
+        raise HTTPException(status_code=400, detail="You have already placed a hold on this book.")
 
     return {"detail": f"You have been placed on the waitlist for '{book.title}'."}
 
+@router.get("/{book_id}/hold")
+def get_hold_position(
+    book_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    position = queue_position(db, current_user.id, book_id)
+    if not position:
+        raise HTTPException(status_code=404, detail="You have no hold on this book.")
+    return position
+
+
+# Only the columns the Book schema is built from, fetched as rows rather than ORM objects
+CATALOG_COLUMNS = (
+    Book.id, Book.title, Book.author, Book.isbn, Book.quantity, Book.description, Book.category,
+    Book.cover_image_url, Book.available_count, Book.cover_renditions,
+)
+
+def catalog_select():
+    # Plain select()s so the sync routes here and routers/books_async.py share them
+    return select(*CATALOG_COLUMNS)
+
+def book_dict(book) -> dict:
+    # The Book schema's JSON shape from a catalog row or a Book instance
+    return {
+        "title": book.title,
+        "author": book.author,
+        "isbn": book.isbn,
+        "quantity": book.quantity,
+        "description": book.description,
+        "category": book.category,
+        "cover_image_url": book.cover_image_url,
+        "id": book.id,
+        "available_quantity": book.available_count,
+        "cover_renditions": rendition_urls(book.cover_image_url, book.cover_renditions),
+    }
+
+def to_book_schema(book: Book) -> BookSchema:
+    return BookSchema(**book_dict(book))
+
+def encode_cursor(book, sort: str) -> str:
+    key = [book.title, book.id] if sort == "title" else [book.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str, sort: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, list) or len(key) != (2 if sort == "title" else 1) or not isinstance(key[-1], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+def books_page_select(cursor: Optional[str], limit: int, category: Optional[str], author: Optional[str], sort: str):
+    stmt = catalog_select()
+    if category:
+        stmt = stmt.where(Book.category == category)
+    if author:
+        stmt = stmt.where(Book.author == author)
+
+    if sort == "title":
+        if cursor:
+            stmt = stmt.where(tuple_(Book.title, Book.id) > tuple(decode_cursor(cursor, sort)))
+        stmt = stmt.order_by(Book.title, Book.id)
+    else:
+        if cursor:
+            stmt = stmt.where(Book.id > decode_cursor(cursor, sort)[0])
+        stmt = stmt.order_by(Book.id)
+    # One extra row tells us whether there is a next page
+    return stmt.limit(limit + 1)
+
+def books_page(rows, limit: int, sort: str) -> Response:
+    headers = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers = {"X-Next-Cursor": encode_cursor(rows[-1], sort)}
+    return json_response([book_dict(row) for row in rows], headers)
+
+def search_select(q: str, limit: int, dialect: str):
+    if dialect != "sqlite":
+        raise HTTPException(status_code=501, detail="Search is not available on this database")
+    match = to_match_query(q)
+    if not match:
+        return None
+    return (
+        catalog_select()
+        .join(books_fts, books_fts.c.rowid == Book.id)
+        .where(text("books_fts MATCH :match").bindparams(match=match))
+        .order_by(text(RANK))
+        .limit(limit)
+    )
 
 @router.get("/", response_model=List[BookSchema])
-def get_books(db: Session = Depends(get_db)):
-    books = db.query(Book).all()
-    result = []
-
-    for book in books:
-        borrowed = db.query(Loan).filter(Loan.book_id == book.id, Loan.status == "approved", Loan.returned == False).count()
-        result.append(
-            BookSchema(
-                id=book.id,
-                title=book.title,
-                author=book.author,
-                isbn=book.isbn,
-                quantity=book.quantity,
-                description=book.description,
-                category=book.category,
-                cover_image_url=book.cover_image_url,
-                available_quantity=book.quantity - borrowed
-            )
-        )
-    return result
+def get_books(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    sort: Literal["id", "title"] = "id",
+    db: Session = Depends(get_db)
+):
+    rows = db.execute(books_page_select(cursor, limit, category, author, sort)).all()
+    return books_page(rows, limit, sort)
+
+@router.get("/search", response_model=List[BookSchema])
+def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    db: Session = Depends(get_db)
+):
+    stmt = search_select(q, limit, db.get_bind().dialect.name)
+    if stmt is None:
+        return json_response([])
+    return json_response([book_dict(row) for row in db.execute(stmt).all()])
 
 @router.get("/{book_id}", response_model=BookSchema)
 def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).get(book_id)
-    if not book:
+    row = db.execute(catalog_select().where(Book.id == book_id)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Book not found")
-
-    borrowed = db.query(Loan).filter(Loan.book_id == book.id, Loan.status == "approved", Loan.returned == False).count()
-
-    return BookSchema(
-        id=book.id,
-        title=book.title,
-        author=book.author,
-        isbn=book.isbn,
-        quantity=book.quantity,
-        description=book.description,
-        category=book.category,
-        cover_image_url=book.cover_image_url,
-        available_quantity=book.quantity - borrowed
-    )
+    return json_response(book_dict(row))
 
 @router.post("/", response_model=BookSchema, dependencies=[Depends(get_current_admin)])
 def create_book(
@@ -108,31 +194,35 @@ def create_book(
     cover_image: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    ext = cover_image.filename.split(".")[-1].lower()
-    if ext not in ["jpg", "jpeg", "png", "webp"]:
-        raise HTTPException(status_code=400, detail="Unsupported image format")
-
-    filename = f"{uuid4().hex}.{ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-
-    with open(filepath, "wb") as f:
-        copyfileobj(cover_image.file, f)
-
-    cover_url = f"/static/book-covers/{filename}"
+    cover_url = save_cover(cover_image)
 
     db_book = Book(
         title=title,
         author=author,
         isbn=isbn,
         quantity=quantity,
+        available_count=quantity,
         description=description,
         category=category,
         cover_image_url=cover_url
     )
     db.add(db_book)
+    db.flush()
+    book_changed(db, db_book.id, None, (category, quantity))
+    books_changed(db, catalog=True)
     db.commit()
     db.refresh(db_book)
-    return db_book
+    cover_pool.submit(db_book.id, cover_url)
+    return to_book_schema(db_book)
+
+@router.post("/import", dependencies=[Depends(get_current_admin)])
+def import_catalog(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = None,
+    db: Session = Depends(get_db)
+):
+    fmt = format or ("ndjson" if (file.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv")
+    return import_books(db, file.file, fmt)
 
 @router.put("/{id}", response_model=BookSchema, dependencies=[Depends(get_current_admin)])
 def update_book(
@@ -150,41 +240,38 @@ def update_book(
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
 
+    before = (db_book.category, db_book.quantity)
+    if quantity != db_book.quantity and not set_quantity(db, id, quantity):
+        raise HTTPException(status_code=400, detail="Quantity is below the number of copies on loan")
+    db.refresh(db_book)
     db_book.title = title
     db_book.author = author
     db_book.isbn = isbn
-    db_book.quantity = quantity
     db_book.description = description
     db_book.category = category
 
+    old_cover = None
     if cover_image:
-        ext = cover_image.filename.split(".")[-1].lower()
-        if ext not in ["jpg", "jpeg", "png", "webp"]:
-            raise HTTPException(status_code=400, detail="Unsupported image format")
-
-        if db_book.cover_image_url:
-            try:
-                old_path = db_book.cover_image_url.lstrip("/")
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            except Exception:
-                pass
-
-        filename = f"{uuid4().hex}.{ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        with open(filepath, "wb") as f:
-            copyfileobj(cover_image.file, f)
-        db_book.cover_image_url = f"/static/book-covers/{filename}"
+        old_cover = db_book.cover_image_url
+        db_book.cover_image_url = save_cover(cover_image)
+        db_book.cover_renditions = None
 
+    book_changed(db, id, before, (category, quantity))
+    books_changed(db, catalog=True)
     db.commit()
     db.refresh(db_book)
-    return db_book
+    if cover_image:
+        remove_cover(db, old_cover)
+        cover_pool.submit(id, db_book.cover_image_url)
+    return to_book_schema(db_book)
 
 @router.delete("/{id}", dependencies=[Depends(get_current_admin)])
 def delete_book(id: int, db: Session = Depends(get_db)):
     db_book = db.query(Book).get(id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
+    book_changed(db, id, (db_book.category, db_book.quantity), None)
+    books_changed(db, catalog=True)
     db.delete(db_book)
     db.commit()
     return {"detail": "Book deleted"}
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import Book
+from schemas import Book as BookSchema
+from routers.books import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_SEARCH_RESULTS,
+    book_dict, books_page_select, books_page, catalog_select, search_select,
+)
+from serialization import json_response
+from typing import List, Literal, Optional
+
+# Async twins of the public catalog reads in routers/books.py. Mounted in front
+# of books.router when USE_ASYNC_DB is set, so these requests never occupy a
+# threadpool thread; writes stay on the sync routes.
+router = APIRouter()
+
+@router.get("/", response_model=List[BookSchema])
+async def get_books_async(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    sort: Literal["id", "title"] = "id",
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(books_page_select(cursor, limit, category, author, sort))).all()
+    return books_page(rows, limit, sort)
+
+@router.get("/search", response_model=List[BookSchema])
+async def search_books_async(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    db: AsyncSession = Depends(get_async_db)
+):
+    stmt = search_select(q, limit, db.bind.dialect.name)
+    if stmt is None:
+        return json_response([])
+    return json_response([book_dict(row) for row in (await db.execute(stmt)).all()])
+
+@router.get("/{book_id}", response_model=BookSchema)
+async def get_book_async(book_id: int, db: AsyncSession = Depends(get_async_db)):
+    row = (await db.execute(catalog_select().where(Book.id == book_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return json_response(book_dict(row))
@@ -1,20 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Loan, Book, User
 from datetime import date, timedelta
 from dependencies import get_current_user, get_current_admin
-from schemas import LoanRequest,ReturnBookRequest
+from availability import take_copy, take_copies, release_copy, reconcile_availability
+from schemas import LoanBatchRequest, LoanOutExtended, LoanRecord, LoanRequest,ReturnBookRequest
+from export import ExportFormat, stream_export
+from holds import promote_next_hold
+from fines import settle_fine
+from response_cache import cache_stats
+from metrics import registry
+from rate_limit import client_ip, expensive_routes, loan_request_account_limit, loan_request_ip_limit, rate_limit_stats
+from loan_history import DEFAULT_HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE, loan_history
+from typing import List, Optional, Union
+from stats import loans_ended, loans_rejected, loans_requested, loans_started, read_stats, rebuild_stats, verify_stats
 
 
 router = APIRouter()
 
 
-@router.get("/", dependencies=[Depends(get_current_user)])
-def get_loans(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/", response_model=List[Union[LoanOutExtended, LoanRecord]])
+def get_loans(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Admins page through every loan (LoanOutExtended, cursor and limit apply);
+    # everyone else gets all of their own loans with every column, as before
     if current_user.role == "admin":
-        return db.query(Loan).all()
-    return db.query(Loan).filter(Loan.user_id == current_user.id).all()
+        return loan_history(db, response, None, cursor, limit)
+    return db.query(Loan).filter(Loan.user_id == current_user.id).order_by(Loan.id).all()
 
 
 @router.get("/active", dependencies=[Depends(get_current_admin)])
@@ -22,12 +42,35 @@ def get_active_loans(db: Session = Depends(get_db)):
     return db.query(Loan).filter(Loan.returned == False).all()
 
 
-@router.post("/request", dependencies=[Depends(get_current_user)])
+@router.get("/export", dependencies=[Depends(get_current_admin)])
+def export_loans(format: ExportFormat = "ndjson", active_only: bool = False, db: Session = Depends(get_db)):
+    stmt = select(
+        Loan.id, Loan.user_id, Loan.book_id, Loan.status, Loan.returned,
+        Loan.request_date, Loan.borrowed_on, Loan.due_date, Loan.return_date,
+    ).order_by(Loan.id)
+    if active_only:
+        stmt = stmt.where(Loan.returned == False)
+    return stream_export(db, stmt, "active-loans" if active_only else "loans", format)
+
+
+def _duplicate_pending_request(exc: IntegrityError) -> bool:
+    # ux_loans_pending_user_book: one pending request per user and book. PostgreSQL
+    # names the violated index; SQLite only lists its columns
+    constraint = getattr(getattr(exc.orig, "diag", None), "constraint_name", None)
+    if constraint is not None:
+        return constraint == "ux_loans_pending_user_book"
+    return "loans.user_id, loans.book_id" in str(exc.orig)
+
+
+@router.post("/request", dependencies=[Depends(expensive_routes)])
 def request_loan(
     request: LoanRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    loan_request_ip_limit.check(client_ip(http_request))
+    loan_request_account_limit.check(current_user.matric_no)
     book_id = request.book_id
 
     book = db.query(Book).get(book_id)
@@ -42,24 +85,33 @@ def request_loan(
         returned=False
     )
     db.add(loan)
-    db.commit()
+    loans_requested(db)
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        if not _duplicate_pending_request(exc):
+            raise
+        raise HTTPException(status_code=400, detail="You already have a pending request for this book")
     return {"detail": "Loan requested successfully."}
 
 
 @router.post("/{loan_id}/approve", dependencies=[Depends(get_current_admin)])
 def approve_loan(loan_id: int, db: Session = Depends(get_db)):
-    loan = db.query(Loan).get(loan_id)
-    if not loan or loan.status != "pending":
+    # Conditional on status so two admins can't approve the same request twice
+    approved = db.query(Loan).filter(Loan.id == loan_id, Loan.status == "pending").update({
+        "status": "approved",
+        "borrowed_on": date.today(),
+        "due_date": date.today() + timedelta(days=14),
+    }, synchronize_session=False)
+    if not approved:
         raise HTTPException(status_code=404, detail="Loan not found or already processed")
-    
-    book = db.query(Book).get(loan.book_id)
-    if book.quantity <= 0:
-        raise HTTPException(status_code=400, detail="Book out of stock")
 
-    loan.status = "approved"
-    loan.borrowed_on = date.today()
-    loan.due_date = date.today() + timedelta(days=14)
-    book.quantity -= 1
+    loan = db.query(Loan).get(loan_id)
+    if not take_copy(db, loan.book_id):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Book out of stock")
+    loans_started(db, [(loan.book_id, loan.due_date)])
     db.commit()
     return {"detail": "Loan approved."}
 
@@ -71,14 +123,77 @@ def reject_loan(loan_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Loan not found or already processed")
     
     loan.status = "rejected"
+    loans_rejected(db)
     db.commit()
     return {"detail": "Loan rejected."}
 
 
+@router.post("/batch", dependencies=[Depends(get_current_admin)])
+def process_loan_batch(request: LoanBatchRequest, db: Session = Depends(get_db)):
+    loan_ids = list(dict.fromkeys(request.loan_ids))
+    pending = update(Loan).where(Loan.id.in_(loan_ids), Loan.status == "pending")
+    results = {}
+
+    if request.action == "reject":
+        rejected = db.scalars(
+            pending.values(status="rejected").returning(Loan.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        results.update((loan_id, (True, "Loan rejected.")) for loan_id in rejected)
+        loans_rejected(db, len(rejected))
+    else:
+        due_date = date.today() + timedelta(days=14)
+        # Claiming the pending rows first takes the write lock (row locks on PostgreSQL),
+        # so an overlapping batch from another admin waits and then finds them processed
+        claimed = db.scalars(
+            pending.values(status="approved", borrowed_on=date.today(), due_date=due_date)
+            .returning(Loan.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        rows = db.execute(
+            select(Loan.id, Loan.book_id, Book.available_count)
+            .join(Book, Book.id == Loan.book_id)
+            .where(Loan.id.in_(claimed))
+            .order_by(Loan.id)
+            .with_for_update(of=Book)
+        ).all()
+
+        # Oldest requests get the remaining copies first
+        shelf = {book_id: available for _, book_id, available in rows}
+        taken = {}
+        started = []
+        for loan_id, book_id, _ in rows:
+            if shelf[book_id] > 0:
+                shelf[book_id] -= 1
+                taken[book_id] = taken.get(book_id, 0) + 1
+                started.append((book_id, due_date))
+                results[loan_id] = (True, "Loan approved.")
+        short = [loan_id for loan_id in claimed if loan_id not in results]
+        if short:
+            db.execute(
+                update(Loan).where(Loan.id.in_(short))
+                .values(status="pending", borrowed_on=None, due_date=None)
+                .execution_options(synchronize_session=False)
+            )
+            results.update((loan_id, (False, "Book out of stock")) for loan_id in short)
+        if take_copies(db, taken) != len(taken):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Availability changed, retry the batch")
+        loans_started(db, started)
+
+    db.commit()
+    missing = (False, "Loan not found or already processed")
+    report = []
+    for loan_id in loan_ids:
+        ok, detail = results.get(loan_id, missing)
+        report.append({"loan_id": loan_id, "ok": ok, "detail": detail})
+    return {"processed": sum(row["ok"] for row in report), "results": report}
+
+
 
 
 
-@router.post("/return", dependencies=[Depends(get_current_user)])
+@router.post("/return")
 def return_book(
     request: ReturnBookRequest,
     db: Session = Depends(get_db),
@@ -86,19 +201,55 @@ def return_book(
 ):
     book_id = request.book_id
 
-    loan = db.query(Loan).filter_by(book_id=book_id, user_id=current_user.id, returned=False).first()
+    loan = db.query(Loan).filter_by(book_id=book_id, user_id=current_user.id, status="approved", returned=False).first()
     if not loan:
         raise HTTPException(status_code=404, detail="No active loan found")
-    
-    loan.returned = True
-    loan.return_date = date.today()
 
-    book = db.query(Book).get(book_id)
-    book.quantity += 1
+    returned = db.query(Loan).filter(Loan.id == loan.id, Loan.returned == False).update({
+        "returned": True,
+        "return_date": date.today(),
+    }, synchronize_session=False)
+    if not returned:
+        raise HTTPException(status_code=404, detail="No active loan found")
+    release_copy(db, book_id)
+    promote_next_hold(db, book_id)
+    loans_ended(db, [(book_id, loan.due_date)])
+    fine = settle_fine(db, loan)
     db.commit()
 
-    fine = 0
-    if date.today() > loan.due_date:
-        fine = (date.today() - loan.due_date).days * 50
-    
     return {"detail": "Book returned successfully.", "fine": fine}
+
+
+@router.get("/stats", dependencies=[Depends(get_current_admin)])
+def get_stats(top: int = Query(10, ge=1, le=100), db: Session = Depends(get_db)):
+    return read_stats(db, top)
+
+
+@router.post("/stats/rebuild", dependencies=[Depends(get_current_admin)])
+def rebuild_dashboard_stats(db: Session = Depends(get_db)):
+    drift = verify_stats(db)
+    rebuild_stats(db)
+    db.commit()
+    return {"drifted": len(drift), "counters": drift}
+
+
+@router.get("/cache-stats", dependencies=[Depends(get_current_admin)])
+def get_cache_stats():
+    return cache_stats.snapshot()
+
+
+@router.get("/rate-limits", dependencies=[Depends(get_current_admin)])
+def get_rate_limits():
+    return rate_limit_stats()
+
+
+@router.get("/slow-queries", dependencies=[Depends(get_current_admin)])
+def get_slow_queries():
+    # Most recent first; only collected with METRICS_ENABLED
+    return registry.slow_query_samples()
+
+
+@router.post("/reconcile-availability", dependencies=[Depends(get_current_admin)])
+def reconcile_book_availability(fix: bool = True, db: Session = Depends(get_db)):
+    drift = reconcile_availability(db, fix=fix)
+    return {"drifted": len(drift), "fixed": fix, "books": drift}
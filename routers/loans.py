@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Loan, Book
+from models import Fine, Loan, User
 from datetime import date, timedelta
+from typing import Optional
 from dependencies import get_current_user, get_current_admin
+from availability import take_copy, release_copy
+from holds import promote_next_hold
+from fines import settle_fine, user_fines
+from stats import loans_ended, loans_started
 
 router = APIRouter()
 
@@ -11,33 +17,72 @@ router = APIRouter()
 def get_active_loans(db: Session = Depends(get_db)):
     return db.query(Loan).filter(Loan.returned == False).all()
 
+@router.get("/overdue", dependencies=[Depends(get_current_admin)])
+def get_overdue_loans(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    # Most overdue first, from the fines the sweep materialized; cursor is "<due_date>:<loan_id>"
+    stmt = select(Fine).where(Fine.returned == False).order_by(Fine.due_date, Fine.loan_id).limit(limit + 1)
+    if cursor:
+        try:
+            due, loan_id = cursor.split(":")
+            stmt = stmt.where(tuple_(Fine.due_date, Fine.loan_id) > (date.fromisoformat(due), int(loan_id)))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    fines = db.scalars(stmt).all()
+    if len(fines) > limit:
+        fines = fines[:limit]
+        response.headers["X-Next-Cursor"] = f"{fines[-1].due_date.isoformat()}:{fines[-1].loan_id}"
+    return [
+        {
+            "loan_id": fine.loan_id, "user_id": fine.user_id, "book_id": fine.book_id, "due_date": fine.due_date,
+            "days_overdue": fine.days_overdue, "amount": fine.amount, "assessed_on": fine.assessed_on,
+        }
+        for fine in fines
+    ]
+
+@router.get("/fines/me")
+def get_my_fines(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return user_fines(db, current_user.id)
+
+@router.get("/fines/{user_id}", dependencies=[Depends(get_current_admin)])
+def get_user_fines(user_id: int, db: Session = Depends(get_db)):
+    return user_fines(db, user_id)
+
 @router.post("/borrow", dependencies=[Depends(get_current_user)])
 def borrow_book(user_id: int, book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).get(book_id)
-    if not book or book.quantity <= 0:
+    if not take_copy(db, book_id):
         raise HTTPException(status_code=400, detail="Book not available")
     loan = Loan(
         user_id=user_id,
         book_id=book_id,
         borrowed_on=date.today(),
         due_date=date.today() + timedelta(days=14),
+        status="approved",
         returned=False
     )
-    book.quantity -= 1
     db.add(loan)
+    loans_started(db, [(book_id, loan.due_date)], from_pending=False)
     db.commit()
     return {"detail": "Book borrowed"}
 
 @router.post("/{id}/return", dependencies=[Depends(get_current_user)])
 def return_book(id: int, db: Session = Depends(get_db)):
     loan = db.query(Loan).get(id)
-    if not loan or loan.returned:
+    if not loan or loan.status != "approved":
+        raise HTTPException(status_code=404, detail="Loan not found or already returned")
+    returned = db.query(Loan).filter(Loan.id == id, Loan.returned == False).update({
+        "returned": True,
+        "return_date": date.today(),
+    }, synchronize_session=False)
+    if not returned:
         raise HTTPException(status_code=404, detail="Loan not found or already returned")
-    loan.returned = True
-    book = db.query(Book).get(loan.book_id)
-    book.quantity += 1
+    release_copy(db, loan.book_id)
+    promote_next_hold(db, loan.book_id)
+    loans_ended(db, [(loan.book_id, loan.due_date)])
+    fine = settle_fine(db, loan)
     db.commit()
-    fine = 0
-    if date.today() > loan.due_date:
-        fine = (date.today() - loan.due_date).days * 50
     return {"detail": "Book returned", "fine": fine}
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException , UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import os
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from database import get_db
-from models import User, Loan
+from models import User
 from schemas import User as UserSchema, UserUpdate, PasswordChange, UserOutExtended
-from dependencies import get_current_admin, get_current_user
-from utils import get_password_hash, verify_password
+from dependencies import get_current_admin, get_current_user, invalidate_user
+from hashing import hash_password, check_password
+from export import ExportFormat, stream_export
+from uploads import receive_upload
+from loan_history import DEFAULT_HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE, loan_history
+from typing import Optional
 
 
 
@@ -20,21 +26,36 @@ def update_me(user_up: UserUpdate, db: Session = Depends(get_db), current_user:
     current_user.name = user_up.name or current_user.name
     current_user.department = user_up.department or current_user.department
     db.commit()
+    invalidate_user(current_user.id)
     db.refresh(current_user)
     return current_user
 
+def save_password(db: Session, user_id: int, hashed_password: str):
+    db.query(User).filter(User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
 @router.post("/me/password")
-def change_password(data: PasswordChange, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not verify_password(data.current_password, current_user.hashed_password):
+async def change_password(data: PasswordChange, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    user_id, hashed_password = current_user.id, current_user.hashed_password
+    # Don't hold a pooled connection while bcrypt runs
+    await run_in_threadpool(db.close)
+    if not await check_password(data.current_password, hashed_password):
         raise HTTPException(status_code=403, detail="Incorrect current password")
-    current_user.hashed_password = get_password_hash(data.new_password)
-    db.commit()
+    await run_in_threadpool(save_password, db, user_id, await hash_password(data.new_password))
+    invalidate_user(user_id)
     return {"detail": "Password updated successfully"}
 
 @router.get("/", response_model=list[UserSchema], dependencies=[Depends(get_current_admin)])
 def get_users(db: Session = Depends(get_db)):
     return db.query(User).all()
 
+@router.get("/export", dependencies=[Depends(get_current_admin)])
+def export_users(format: ExportFormat = "ndjson", db: Session = Depends(get_db)):
+    stmt = select(
+        User.id, User.name, User.matric_no, User.department, User.role, User.profile_picture_url,
+    ).order_by(User.id)
+    return stream_export(db, stmt, "users", format)
+
 @router.put("/{id}", response_model=UserSchema, dependencies=[Depends(get_current_admin)])
 def update_user(id: int, user_up: UserUpdate, db: Session = Depends(get_db)):
     user = db.query(User).get(id)
@@ -45,33 +66,25 @@ def update_user(id: int, user_up: UserUpdate, db: Session = Depends(get_db)):
     user.name = user_up.name or user.name
     user.department = user_up.department or user.department
     db.commit()
+    invalidate_user(user.id)
     db.refresh(user)
     return user
 
 @router.get("/{user_id}/details", response_model=UserOutExtended, dependencies=[Depends(get_current_admin)])
-def get_user_details(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).get(user_id)
+def get_user_details(
+    user_id: int,
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    # Two queries whatever the history length: the user, then one page of loans joined to titles
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-
-    loans = db.query(Loan).filter(Loan.user_id == user_id).all()
-
-    loans_data = [
-        {
-            "id": loan.id,
-            "book_id": loan.book_id,
-            "book_title": loan.book.title,
-            "borrowed_on": loan.borrowed_on,
-            "due_date": loan.due_date,
-            "return_date": loan.return_date,
-            "status": loan.status,
-        }
-        for loan in loans
-    ]
-
     return {
-        **user.__dict__,
-        "loans": loans_data,
+        **{column.key: getattr(user, column.key) for column in User.__table__.columns},
+        "loans": loan_history(db, response, user_id, cursor, limit),
         "login_history": []  # Optional future expansion
     }
 
@@ -83,26 +96,47 @@ def delete_user(id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
     db.commit()
+    invalidate_user(id)
     return {"detail": "User deleted"}
 
 
 
 UPLOAD_DIR = "static/profile_pics"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+PICTURE_EXTENSIONS = ("jpg", "jpeg", "png", "webp", "gif")
+PICTURE_MAX_BYTES = int(os.getenv("PICTURE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# The body is parsed by uploads.receive_upload, so document it by hand
+PICTURE_UPLOAD_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
 
-@router.post("/me/picture", response_model=UserSchema)
-def upload_profile_picture(
-    file: UploadFile = File(...),
+def save_picture(db: Session, user_id: int, filename: str) -> User | None:
+    picture_url = f"/{UPLOAD_DIR}/{filename}"
+    user = db.query(User).get(user_id)
+    if not user:
+        # Deleted while the upload streamed. Names are content hashes, so keep the
+        # file if another user's picture is the same image
+        if db.scalar(select(User.id).where(User.profile_picture_url == picture_url).limit(1)) is None:
+            os.remove(os.path.join(UPLOAD_DIR, filename))
+        return None
+    user.profile_picture_url = picture_url
+    db.commit()
+    db.refresh(user)
+    return user
+
+@router.post("/me/picture", response_model=UserSchema, openapi_extra=PICTURE_UPLOAD_BODY)
+async def upload_profile_picture(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    filename = f"{current_user.id}_{file.filename.replace(' ', '_').replace('/', '_')}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-
-    with open(filepath, "wb") as f:
-        f.write(file.file.read())
-
-    current_user.profile_picture_url = f"/{filepath}"
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    user_id = current_user.id
+    # Don't hold a pooled connection while the upload streams in
+    await run_in_threadpool(db.close)
+    filename = await receive_upload(request, "file", UPLOAD_DIR, PICTURE_EXTENSIONS, PICTURE_MAX_BYTES, "Profile picture")
+    user = await run_in_threadpool(save_picture, db, user_id, filename)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
+    return user
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import Optional, List
+from typing import Dict, Literal, Optional, List
 from pydantic import BaseModel, Field
 
 
@@ -19,6 +19,8 @@ class BookUpdate(BookBase): ...
 class Book(BookBase):
     id: int
     available_quantity: Optional[int] = None  # NEW calculated field
+    # {"thumb": {"webp": url, "jpeg": url}, "medium": {...}} once rendered
+    cover_renditions: Optional[Dict[str, Dict[str, str]]] = None
 
     class Config:
         from_attributes = True
@@ -91,6 +93,22 @@ class LoanOut(BaseModel):
         from_attributes = True
 
 
+# Every loans column: what GET /dashboard/ returns to students
+class LoanRecord(BaseModel):
+    id: int
+    user_id: Optional[int]
+    book_id: Optional[int]
+    borrowed_on: Optional[date]
+    due_date: Optional[date]
+    returned: Optional[bool]
+    status: Optional[str]
+    request_date: Optional[date]
+    return_date: Optional[date]
+
+    class Config:
+        from_attributes = True
+
+
 # === EXTENDED USER FOR ADMINS ===
 
 class LoanOutExtended(BaseModel):
@@ -131,3 +149,7 @@ class LoanRequest(BaseModel):
 class ReturnBookRequest(BaseModel):
     book_id: int
 
+class LoanBatchRequest(BaseModel):
+    loan_ids: List[int] = Field(min_length=1, max_length=500)
+    action: Literal["approve", "reject"]
+
@@ -0,0 +1,61 @@
+import re
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Engine
+
+# External-content FTS5 index over books, kept in sync by triggers so every
+# write path (ORM, bulk inserts, raw SQL) updates it in the same transaction.
+FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, description, category,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, description, category)
+        VALUES (new.id, new.title, new.author, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, category)
+        VALUES ('delete', old.id, old.title, old.author, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, description, category ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, category)
+        VALUES ('delete', old.id, old.title, old.author, old.description, old.category);
+        INSERT INTO books_fts(rowid, title, author, description, category)
+        VALUES (new.id, new.title, new.author, new.description, new.category);
+    END
+    """,
+]
+
+books_fts = table("books_fts", column("rowid"))
+
+# bm25 weights for title, author, description, category
+RANK = "bm25(books_fts, 10.0, 5.0, 1.0, 2.0)"
+
+
+def setup_search(engine: Engine):
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'")).first()
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            # Index books that were added before the search table existed
+            conn.execute(text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')"))
+
+
+def to_match_query(q: str) -> str | None:
+    # Quote every term so user input can't inject FTS5 syntax, and prefix-match each one
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
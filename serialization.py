@@ -0,0 +1,22 @@
+import json
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: the stdlib encoder is used without it
+    orjson = None
+
+# The catalog reads project their rows straight into dicts and return them as
+# JSON bytes. The data is our own DB columns, so constructing a Pydantic model
+# per row and having FastAPI validate it again for response_model is skipped;
+# the routes keep response_model for the OpenAPI schema only.
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def json_response(content, headers: dict | None = None) -> Response:
+    return Response(dumps(content), media_type="application/json", headers=headers)
@@ -0,0 +1,191 @@
+from datetime import date
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import Book, DashboardStat, Loan
+
+# /dashboard/stats reads a handful of counters from dashboard_stats instead of
+# scanning loans. Every loan state change bumps them in the same transaction
+# (like available_count in availability.py); rebuild_stats recomputes them
+# from scratch and verify_stats reports any drift.
+
+LOANS = "loans"        # key "pending" / "active"
+DUE = "due"            # key ISO due date -> active loans due that day
+COPIES = "copies"      # key category -> copies in the catalog
+ON_LOAN = "on_loan"    # key category -> active loans
+BORROWED = "borrowed"  # key book id -> approvals ever
+METRICS = (LOANS, DUE, COPIES, ON_LOAN, BORROWED)
+
+ACTIVE = (Loan.status == "approved") & (Loan.returned == False)
+
+
+def _key(value) -> str:
+    if value is None:
+        return ""
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+def bump(db: Session, changes):
+    # changes: (metric, key, delta) triples, summed per counter and applied as one upsert
+    totals = {}
+    for metric, key, delta in changes:
+        totals[metric, _key(key)] = totals.get((metric, _key(key)), 0) + delta
+    rows = [{"metric": metric, "key": key, "value": delta} for (metric, key), delta in totals.items() if delta]
+    if rows:
+        stmt = dialect_insert(db.get_bind())(DashboardStat)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DashboardStat.metric, DashboardStat.key],
+                set_={"value": DashboardStat.value + stmt.excluded.value},
+            ),
+            rows,
+        )
+
+
+def _categories(db: Session, book_ids) -> dict:
+    return dict(db.execute(select(Book.id, Book.category).where(Book.id.in_(set(book_ids)))).all())
+
+
+def loans_requested(db: Session, count: int = 1):
+    bump(db, [(LOANS, "pending", count)])
+
+
+def loans_rejected(db: Session, count: int = 1):
+    bump(db, [(LOANS, "pending", -count)])
+
+
+def loans_started(db: Session, loans, from_pending: bool = True):
+    # loans: (book_id, due_date) pairs that just became active
+    categories = _categories(db, [book_id for book_id, _ in loans])
+    changes = [(LOANS, "pending", -len(loans))] if from_pending else []
+    for book_id, due_date in loans:
+        changes += [(LOANS, "active", 1), (DUE, due_date, 1), (BORROWED, book_id, 1)]
+        if book_id in categories:
+            changes.append((ON_LOAN, categories[book_id], 1))
+    bump(db, changes)
+
+
+def loans_ended(db: Session, loans):
+    categories = _categories(db, [book_id for book_id, _ in loans])
+    changes = []
+    for book_id, due_date in loans:
+        changes += [(LOANS, "active", -1), (DUE, due_date, -1)]
+        if book_id in categories:
+            changes.append((ON_LOAN, categories[book_id], -1))
+    bump(db, changes)
+
+
+def book_changed(db: Session, book_id: int, before, after):
+    # before/after: (category, quantity), None when the book is created or deleted
+    on_loan = db.scalar(select(func.count(Loan.id)).where(Loan.book_id == book_id, ACTIVE)) if before else 0
+    changes = []
+    if before:
+        changes += [(COPIES, before[0], -(before[1] or 0)), (ON_LOAN, before[0], -on_loan)]
+    if after:
+        changes += [(COPIES, after[0], after[1] or 0), (ON_LOAN, after[0], on_loan)]
+    bump(db, changes)
+
+
+def _fresh(db: Session, metrics) -> dict:
+    queries = {
+        LOANS: select(Loan.status, func.count(Loan.id))
+        .where(Loan.returned == False, Loan.status.in_(("pending", "approved")))
+        .group_by(Loan.status),
+        DUE: select(Loan.due_date, func.count(Loan.id)).where(ACTIVE).group_by(Loan.due_date),
+        COPIES: select(Book.category, func.sum(func.coalesce(Book.quantity, 0))).group_by(Book.category),
+        ON_LOAN: select(Book.category, func.count(Loan.id))
+        .join(Loan, Loan.book_id == Book.id)
+        .where(ACTIVE)
+        .group_by(Book.category),
+        BORROWED: select(Loan.book_id, func.count(Loan.id)).where(Loan.status == "approved").group_by(Loan.book_id),
+    }
+    counters = {}
+    for metric in metrics:
+        for key, value in db.execute(queries[metric]).all():
+            if metric == LOANS:
+                key = "active" if key == "approved" else key
+            if value:
+                counters[metric, _key(key)] = value
+    return counters
+
+
+def rebuild_stats(db: Session, metrics=METRICS):
+    counters = _fresh(db, metrics)
+    db.execute(delete(DashboardStat).where(DashboardStat.metric.in_(metrics)))
+    if counters:
+        db.execute(
+            DashboardStat.__table__.insert(),
+            [{"metric": metric, "key": key, "value": value} for (metric, key), value in counters.items()],
+        )
+
+
+def verify_stats(db: Session) -> list[dict]:
+    stored = {
+        (metric, key): value
+        for metric, key, value in db.execute(
+            select(DashboardStat.metric, DashboardStat.key, DashboardStat.value).where(DashboardStat.value != 0)
+        ).all()
+    }
+    fresh = _fresh(db, METRICS)
+    return [
+        {"metric": metric, "key": key, "stored": stored.get((metric, key), 0), "expected": fresh.get((metric, key), 0)}
+        for metric, key in sorted(stored.keys() | fresh.keys())
+        if stored.get((metric, key), 0) != fresh.get((metric, key), 0)
+    ]
+
+
+def read_stats(db: Session, top: int = 10) -> dict:
+    counters = {
+        (metric, key): value
+        for metric, key, value in db.execute(
+            select(DashboardStat.metric, DashboardStat.key, DashboardStat.value)
+            .where(DashboardStat.metric.in_((LOANS, COPIES, ON_LOAN)), DashboardStat.value != 0)
+        ).all()
+    }
+    overdue = db.scalar(
+        select(func.coalesce(func.sum(DashboardStat.value), 0))
+        .where(DashboardStat.metric == DUE, DashboardStat.key != "", DashboardStat.key < date.today().isoformat())
+    )
+    top_rows = db.execute(
+        select(DashboardStat.key, DashboardStat.value)
+        .where(DashboardStat.metric == BORROWED, DashboardStat.value > 0)
+        .order_by(DashboardStat.value.desc(), DashboardStat.key)
+        .limit(top)
+    ).all()
+    titles = dict(db.execute(select(Book.id, Book.title).where(Book.id.in_([int(key) for key, _ in top_rows]))).all())
+
+    categories = sorted({key for metric, key in counters if metric in (COPIES, ON_LOAN)})
+    return {
+        "active_loans": counters.get((LOANS, "active"), 0),
+        "pending_requests": counters.get((LOANS, "pending"), 0),
+        "overdue_loans": overdue,
+        "categories": [
+            {
+                "category": category or None,
+                "copies": counters.get((COPIES, category), 0),
+                "on_loan": counters.get((ON_LOAN, category), 0),
+                "utilisation": round(counters.get((ON_LOAN, category), 0) / counters[COPIES, category], 4)
+                if counters.get((COPIES, category)) else None,
+            }
+            for category in categories
+        ],
+        "top_books": [
+            {"book_id": int(key), "title": titles.get(int(key)), "times_borrowed": value}
+            for key, value in top_rows
+        ],
+    }
+
+
+if __name__ == "__main__":
+    # python stats.py [--rebuild]: report counters that disagree with a from-scratch recomputation
+    import sys
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        if "--rebuild" in sys.argv:
+            rebuild_stats(session)
+            session.commit()
+        drift = verify_stats(session)
+        for row in drift:
+            print(row)
+        sys.exit(1 if drift else 0)
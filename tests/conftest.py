@@ -0,0 +1,50 @@
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.common import temp_engine, make_app, seed
+from models import User
+from utils import create_access_token
+
+
+@pytest.fixture
+def library():
+    # A seeded throwaway database; user 1 (MAT000001) is an admin
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as db:
+        seed(db, books=50, users=10, loans=100)
+        db.query(User).filter(User.id == 1).update({"role": "admin"})
+        db.commit()
+    yield SessionLocal
+    engine.dispose()
+
+
+@pytest.fixture
+def client(library):
+    with TestClient(make_app(library)) as client:
+        yield client
+
+
+def bearer(matric_no: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': matric_no})}"}
+
+
+@pytest.fixture
+def admin():
+    return bearer("MAT000001")
+
+
+@pytest.fixture
+def auth():
+    # auth("MAT000002") -> headers for that user
+    return bearer
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    # Buckets are module-level; every test starts with full ones
+    import rate_limit
+
+    rate_limit.buckets.clear()
+    rate_limit._unavailable_until = 0.0
+    yield
+    rate_limit.buckets.clear()
+    rate_limit._unavailable_until = 0.0
@@ -0,0 +1,60 @@
+import io
+from sqlalchemy import event, update
+from availability import reconcile_availability
+from book_import import import_books
+from models import Book
+
+
+def csv_file(*rows) -> io.BytesIO:
+    lines = ["title,author,isbn,quantity,category"] + [",".join(map(str, row)) for row in rows]
+    return io.BytesIO("\n".join(lines).encode())
+
+
+def test_reimport_below_copies_on_loan_is_rejected(library):
+    with library() as db:
+        book = db.query(Book).filter(Book.quantity >= 2).first()
+        isbn, quantity = book.isbn, book.quantity
+        book.available_count = quantity - 2  # two copies out
+        db.commit()
+        report = import_books(db, csv_file((book.title, book.author, isbn, 1, "Law"), ("New", "Someone", "999", 3, "Law")), "csv")
+
+        assert report["imported"] == 1
+        assert report["failed"] == 1
+        assert report["errors"][0]["row"] == 2
+        assert "copies on loan" in report["errors"][0]["errors"][0]
+        db.expire_all()
+        assert db.query(Book).filter(Book.isbn == isbn).one().quantity == quantity
+        assert db.query(Book).filter(Book.isbn == "999").one().available_count == 3
+
+
+def test_reimport_moves_availability_with_quantity(library):
+    with library() as db:
+        drifted = [row["book_id"] for row in reconcile_availability(db, fix=False)]
+        book = db.query(Book).filter(Book.id.not_in(drifted)).first()
+        on_loan = book.quantity - book.available_count
+        report = import_books(db, csv_file((book.title, book.author, book.isbn, on_loan + 4, "Law")), "csv")
+        assert report["imported"] == 1
+        db.expire_all()
+        assert db.get(Book, book.id).available_count == 4
+        assert book.id not in [row["book_id"] for row in reconcile_availability(db, fix=False)]
+
+
+def test_rows_skipped_by_a_concurrent_loan_are_not_counted(library):
+    with library() as db:
+        book = Book(title="Racy", author="A", isbn="RACE1", quantity=3, available_count=3)
+        db.add(book)
+        db.commit()
+
+        @event.listens_for(db, "do_orm_execute")
+        def lend_every_copy(state):
+            # Approved after flush() checked the copies on loan, before the upsert runs
+            if state.is_insert:
+                state.session.connection().execute(
+                    update(Book).where(Book.isbn == "RACE1").values(available_count=0)
+                )
+
+        report = import_books(db, csv_file(("Racy", "A", "RACE1", 2, "Law"), ("Other", "B", "RACE2", 1, "Law")), "csv")
+        assert (report["imported"], report["failed"]) == (1, 1)
+        assert report["errors"][0]["row"] == 2
+        db.expire_all()
+        assert db.get(Book, book.id).quantity == 3
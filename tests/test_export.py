@@ -0,0 +1,16 @@
+import json
+from models import Loan, User
+
+
+def test_exports_stream_from_the_request_database(client, library, admin):
+    response = client.get("/users/export", headers=admin)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    with library() as db:
+        assert [row["id"] for row in rows] == [user.id for user in db.query(User).order_by(User.id)]
+
+    response = client.get("/dashboard/export", params={"format": "csv", "active_only": True}, headers=admin)
+    assert response.status_code == 200
+    with library() as db:
+        active = db.query(Loan).filter(Loan.returned == False).count()
+    assert len(response.text.splitlines()) == active + 1
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+import pytest
+from fines import FINE_PER_DAY, _row, _upsert, sweep_overdue, user_fines
+from models import Loan, User
+
+
+@pytest.fixture
+def borrower(library):
+    # A user whose only loans are two overdue ones: 10 and 4 days late
+    today = date.today()
+    with library() as db:
+        user = User(name="Late", matric_no="LATE001", department="Law", hashed_password="x")
+        db.add(user)
+        db.flush()
+        loans = [
+            Loan(user_id=user.id, book_id=book_id, borrowed_on=today - timedelta(days=14 + late),
+                 due_date=today - timedelta(days=late), status="approved", returned=False)
+            for book_id, late in ((1, 10), (2, 4))
+        ]
+        db.add_all(loans)
+        db.commit()
+        return user.id, [loan.id for loan in loans]
+
+
+def fines_of(library, user_id: int) -> dict:
+    with library() as db:
+        return user_fines(db, user_id)
+
+
+def test_sweep_return_and_sweep_again(client, library, borrower, auth):
+    user_id, (first, second) = borrower
+    today = date.today()
+    with library() as db:
+        sweep_overdue(db, today)
+    fines = fines_of(library, user_id)
+    assert fines["balance"] == fines["accruing"] == 14 * FINE_PER_DAY
+
+    response = client.post(f"/loans/{first}/return", headers=auth("LATE001"))
+    assert response.status_code == 200 and response.json()["fine"] == 10 * FINE_PER_DAY
+    fines = fines_of(library, user_id)
+    assert (fines["balance"], fines["accruing"]) == (14 * FINE_PER_DAY, 4 * FINE_PER_DAY)
+
+    # Two days on: the open loan keeps accruing, the returned one stays settled
+    with library() as db:
+        sweep_overdue(db, today + timedelta(days=2))
+    fines = fines_of(library, user_id)
+    assert (fines["balance"], fines["accruing"]) == (16 * FINE_PER_DAY, 6 * FINE_PER_DAY)
+    assert [fine["returned"] for fine in fines["fines"]] == [True, False]
+
+
+def test_sweep_does_not_reopen_a_fine_settled_after_it_read_the_loan(client, library, borrower, auth):
+    user_id, (first, _) = borrower
+    today = date.today()
+    with library() as db:
+        sweep_overdue(db, today)
+        stale = db.query(Loan.id, Loan.user_id, Loan.book_id, Loan.due_date).filter(Loan.id == first).one()
+    assert client.post(f"/loans/{first}/return", headers=auth("LATE001")).status_code == 200
+
+    # The upsert a sweep makes for a loan it selected while still open
+    with library() as db:
+        _upsert(db, [_row(*stale, today + timedelta(days=1), False)], sweep=True)
+        db.commit()
+    fines = fines_of(library, user_id)
+    assert fines["fines"][0]["returned"] and fines["fines"][0]["amount"] == 10 * FINE_PER_DAY
+    assert fines["accruing"] == 4 * FINE_PER_DAY
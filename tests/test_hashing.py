@@ -0,0 +1,31 @@
+import asyncio
+import time
+import pytest
+from hashing import PasswordPool
+
+
+def counts(pool: PasswordPool) -> tuple:
+    stats = pool.stats()
+    return stats["completed"], stats["failed"], stats["in_flight"]
+
+
+def test_only_successful_hashes_count_as_completed():
+    pool = PasswordPool(0, 4, 1)
+    assert asyncio.run(pool.run(str.upper, "ok")) == "OK"
+    with pytest.raises(ValueError):
+        asyncio.run(pool.run(int, "not a number"))
+    assert counts(pool) == (1, 1, 0)
+
+
+def test_cancelled_hashes_count_as_failed():
+    pool = PasswordPool(0, 4, 1)
+
+    async def cancel():
+        job = asyncio.ensure_future(pool.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+
+    asyncio.run(cancel())
+    assert counts(pool) == (0, 1, 0)
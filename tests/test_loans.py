@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import delete, event
+from sqlalchemy.exc import IntegrityError
+from models import Book, Loan
+
+
+def test_students_get_all_their_loans_with_every_column(client, library, auth):
+    with library() as db:
+        user_id = db.query(Loan.user_id).filter(Loan.user_id != 1).order_by(Loan.user_id).first()[0]
+        expected = [loan.id for loan in db.query(Loan).filter(Loan.user_id == user_id).order_by(Loan.id)]
+    response = client.get("/dashboard/", params={"limit": 1}, headers=auth(f"MAT{user_id:06d}"))
+    assert response.status_code == 200
+    loans = response.json()
+    assert [loan["id"] for loan in loans] == expected
+    assert set(loans[0]) == {
+        "id", "user_id", "book_id", "borrowed_on", "due_date", "returned", "status", "request_date", "return_date",
+    }
+    assert "x-next-cursor" not in response.headers
+
+
+def test_admins_page_through_every_loan(client, library, admin):
+    response = client.get("/dashboard/", params={"limit": 10}, headers=admin)
+    page = response.json()
+    assert len(page) == 10 and "book_title" in page[0]
+    assert response.headers["x-next-cursor"] == str(page[-1]["id"])
+
+
+def new_book(library, isbn: str) -> int:
+    # A book no seeded loan points at
+    with library() as db:
+        book = Book(title="T", author="A", isbn=isbn, quantity=1, available_count=1)
+        db.add(book)
+        db.commit()
+        return book.id
+
+
+def test_a_second_pending_request_for_a_book_is_a_400(client, library, auth):
+    book_id = new_book(library, "PENDING1")
+    headers = auth("MAT000004")
+    assert client.post("/dashboard/request", json={"book_id": book_id}, headers=headers).status_code == 200
+    response = client.post("/dashboard/request", json={"book_id": book_id}, headers=headers)
+    assert response.status_code == 400 and "pending request" in response.json()["detail"]
+
+
+def test_other_integrity_errors_are_not_reported_as_duplicates(client, library, auth):
+    # The book goes away between the lookup and the commit, with foreign keys enforced
+    book_id = new_book(library, "GONE1")
+    event.listen(library.kw["bind"], "begin", lambda connection: connection.exec_driver_sql("PRAGMA foreign_keys=ON"))
+
+    @event.listens_for(library, "before_commit")
+    def delete_book(session):
+        session.execute(delete(Book).where(Book.id == book_id))
+
+    with pytest.raises(IntegrityError, match="FOREIGN KEY"):
+        client.post("/dashboard/request", json={"book_id": book_id}, headers=auth("MAT000004"))
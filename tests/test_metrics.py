@@ -0,0 +1,25 @@
+import threading
+from metrics import Registry
+
+
+def test_slow_query_samples_can_be_read_while_hooks_record(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr("metrics.logger.warning", lambda *args: None)
+    stop = threading.Event()
+
+    def record():
+        while not stop.is_set():
+            registry.record_slow_query("SELECT 1", 0.2, "/books/")
+
+    writers = [threading.Thread(target=record) for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    try:
+        for _ in range(2000):
+            samples = registry.slow_query_samples()
+            assert all(sample["statement"] == "SELECT 1" for sample in samples)
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+    assert registry.slow_total > 0
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+from migrate import _config, upgrade_database
+
+# The tables as create_all() built them before the models gained roles, loan
+# statuses and book categories (the schema of the old tracked library.db)
+LEGACY_SCHEMA = [
+    "CREATE TABLE books (id INTEGER NOT NULL, title VARCHAR, author VARCHAR, isbn VARCHAR, quantity INTEGER, "
+    "PRIMARY KEY (id), UNIQUE (isbn))",
+    "CREATE TABLE users (id INTEGER NOT NULL, name VARCHAR, matric_no VARCHAR, department VARCHAR, "
+    "PRIMARY KEY (id), UNIQUE (matric_no))",
+    "CREATE TABLE loans (id INTEGER NOT NULL, user_id INTEGER, book_id INTEGER, borrowed_on DATE, due_date DATE, "
+    "returned BOOLEAN, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id), "
+    "FOREIGN KEY(book_id) REFERENCES books (id))",
+]
+
+
+def test_legacy_database_is_completed_and_upgraded():
+    path = os.path.join(tempfile.mkdtemp(prefix="library-test-"), "legacy.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO books (title, author, isbn, quantity) VALUES ('Old', 'A', '1', 2)"))
+
+    upgrade_database(engine)
+
+    with engine.connect() as connection:
+        head = ScriptDirectory.from_config(_config(None)).get_current_head()
+        assert connection.scalar(text("SELECT version_num FROM alembic_version")) == head
+        columns = {table: {c["name"] for c in inspect(connection).get_columns(table)} for table in ("books", "users", "loans")}
+        assert {"category", "description", "cover_image_url", "available_count"} <= columns["books"]
+        assert {"role", "hashed_password"} <= columns["users"]
+        assert {"status", "request_date", "return_date"} <= columns["loans"]
+        assert connection.scalar(text("SELECT available_count FROM books")) == 2
+    engine.dispose()
@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import text
+from benchmarks.common import temp_engine, seed
+from benchmarks.query_plans import checks, query_plan
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine, SessionLocal = temp_engine()
+    with SessionLocal() as session:
+        seed(session, books=2_000, loans=10_000)
+        session.execute(text("ANALYZE"))
+        yield session
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", list(checks()))
+def test_query_plan(db, name):
+    stmt, expected = checks()[name]
+    plan = query_plan(db, stmt)
+    for needle in expected:
+        assert needle in plan, plan
+    assert "SCAN loans" not in plan, plan
@@ -0,0 +1,125 @@
+import asyncio
+import ipaddress
+import threading
+import fakeredis
+import httpx
+import pytest
+import rate_limit
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, select
+from benchmarks.common import make_app
+from benchmarks.rate_limit import burst, summary
+from models import Book, Loan, User
+from utils import get_password_hash
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+# An already registered matric number: each call that gets past the limit is a cheap 400
+EXISTING_USER = {"name": "Taken", "matric_no": "MAT000002", "department": "Physics", "password": "secret"}
+
+
+def register(library, peer: str, forwarded_for) -> dict:
+    # One /auth/register per forwarded address, all arriving from `peer`
+    async def go():
+        transport = httpx.ASGITransport(app=make_app(library), client=(peer, 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.post("/auth/register", json=EXISTING_USER, headers={"X-Forwarded-For": address})
+                for address in forwarded_for
+            ]
+
+    return summary(asyncio.run(go()))
+
+
+def test_spoofed_forwarded_for_does_not_reset_the_ip_bucket(library, limited):
+    # The proxy appends the real client; whatever the client sent stays to its left
+    capacity = rate_limit.register_ip_limit.capacity
+    spoofed = [f"198.51.100.{i}, 203.0.113.7" for i in range(capacity + 5)]
+    statuses = register(library, "10.1.2.3", spoofed)
+    assert statuses.get(429) == 5
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(library, limited):
+    capacity = rate_limit.register_ip_limit.capacity
+    statuses = register(library, "203.0.113.7", [f"198.51.100.{i}" for i in range(capacity + 5)])
+    assert statuses.get(429) == 5
+
+
+def test_clients_behind_the_proxy_get_their_own_buckets(library, limited):
+    capacity = rate_limit.register_ip_limit.capacity
+    statuses = register(library, "10.1.2.3", ["203.0.113.7"] * capacity + ["203.0.113.8"])
+    assert 429 not in statuses
+
+
+def test_redis_buckets_stay_off_the_event_loop(library, limited, monkeypatch):
+    buckets = rate_limit.RedisTokenBuckets(fakeredis.FakeRedis(), "test-ratelimit")
+    threads = []
+    monkeypatch.setattr(buckets, "take", lambda *args, take=buckets.take: threads.append(threading.get_ident()) or take(*args))
+    monkeypatch.setattr(rate_limit, "buckets", buckets)
+    capacity = rate_limit.register_ip_limit.capacity
+    statuses = register(library, "203.0.113.7", ["203.0.113.7"] * (capacity + 1))
+    assert statuses == {400: capacity, 429: 1}
+    assert threads and threading.get_ident() not in threads
+
+
+def test_unreachable_redis_skips_the_limits(library, limited, monkeypatch):
+    monkeypatch.setattr(rate_limit, "buckets", rate_limit.make_buckets("redis://127.0.0.1:1/0"))
+    monkeypatch.setattr(rate_limit.register_ip_limit, "errors", 0)
+    capacity = rate_limit.register_ip_limit.capacity
+    assert register(library, "203.0.113.7", ["203.0.113.7"] * (capacity + 1)) == {400: capacity + 1}
+    # Only the first check waits on Redis; the rest skip it until RATE_LIMIT_RETRY_SECONDS pass
+    assert rate_limit.register_ip_limit.errors == 1
+
+
+def fire(app, calls: int, method: str, url: str, **kwargs) -> list:
+    # `calls` concurrent requests
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await burst(client, calls, method, url, **kwargs)
+
+    return asyncio.run(go())
+
+
+def test_login_burst_gets_exactly_the_bucket_capacity_through(library, limited):
+    # Wrong passwords: every attempt the limits let through costs a bcrypt check
+    with library() as db:
+        db.query(User).filter(User.id == 2).update({"hashed_password": get_password_hash("secret")})
+        db.commit()
+    capacity = rate_limit.login_account_limit.capacity
+    responses = fire(make_app(library), capacity + 15, "POST", "/auth/login",
+                     data={"username": "MAT000002", "password": "wrong"})
+    assert summary(responses) == {401: capacity, 429: 15}
+    assert all(int(r.headers["retry-after"]) >= 1 for r in responses if r.status_code == 429)
+
+
+def test_concurrent_duplicate_loan_requests_leave_one_pending(library, limited, auth):
+    with library() as db:
+        pending = select(Loan.book_id).where(Loan.user_id == 3, Loan.status == "pending")
+        book_id = db.scalar(select(func.min(Book.id)).where(Book.id.not_in(pending)))
+    statuses = summary(fire(make_app(library), 20, "POST", "/dashboard/request",
+                            headers=auth("MAT000003"), json={"book_id": book_id}))
+    with library() as db:
+        pending = db.scalar(
+            select(func.count(Loan.id)).where(Loan.user_id == 3, Loan.book_id == book_id, Loan.status == "pending")
+        )
+    assert statuses == {200: 1, 400: 19}
+    assert pending == 1
+
+
+def test_concurrency_limit_turns_away_what_does_not_fit():
+    limit = rate_limit.ConcurrencyLimit(4, retry_after=1)
+    app = FastAPI()
+
+    @app.get("/slow", dependencies=[Depends(limit)])
+    async def slow():
+        await asyncio.sleep(0.2)
+
+    responses = fire(app, 20, "GET", "/slow")
+    assert summary(responses) == {200: 4, 429: 16}
+    assert all(r.headers["retry-after"] == "1" for r in responses if r.status_code == 429)
+    assert limit.in_flight == 0 and limit.rejected == 16
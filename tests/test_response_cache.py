@@ -0,0 +1,94 @@
+import asyncio
+import json
+import pickle
+import threading
+import fakeredis
+import httpx
+import pytest
+import response_cache
+from benchmarks.common import make_app
+from cache import RedisCache, redis_client
+
+
+@pytest.fixture
+def app(library, monkeypatch):
+    monkeypatch.setattr(response_cache, "_unavailable_until", 0.0)
+    app = make_app(library)
+    app.add_middleware(response_cache.ResponseCacheMiddleware)
+    return app
+
+
+def use_backend(monkeypatch, cache):
+    monkeypatch.setattr(response_cache, "response_cache", cache)
+
+
+def get(app, *paths, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(path, **kwargs) for path in paths], threading.get_ident()
+
+    return asyncio.run(run())
+
+
+def test_redis_calls_stay_off_the_event_loop(app, monkeypatch):
+    cache = RedisCache(fakeredis.FakeRedis(), "test-responses", 100, 60)
+    threads = []
+    monkeypatch.setattr(cache, "get", lambda key, get=cache.get: threads.append(threading.get_ident()) or get(key))
+    use_backend(monkeypatch, cache)
+    try:
+        (first, second), loop_thread = get(app, "/books/1", "/books/1")
+    finally:
+        cache.close()
+    assert (first.headers["x-cache"], second.headers["x-cache"]) == ("MISS", "HIT")
+    assert first.json() == second.json()
+    assert threads and loop_thread not in threads
+
+
+def test_unreachable_redis_serves_uncached(app, library, monkeypatch):
+    use_backend(monkeypatch, RedisCache(redis_client("redis://127.0.0.1:1/0"), "test-responses", 100, 60))
+    (page, detail), _ = get(app, "/books/", "/books/1")
+    assert page.status_code == detail.status_code == 200
+    assert "x-cache" not in page.headers and detail.json()["id"] == 1
+
+    # Committed writes still succeed when their invalidation can't reach Redis
+    from availability import take_copy
+
+    with library() as db:
+        take_copy(db, 1)
+        db.commit()
+    assert response_cache.cache_stats.snapshot()["errors"] > 0
+
+
+unpickled = []
+
+
+def mark_unpickled():
+    unpickled.append(True)
+
+
+class Exploit:
+    def __reduce__(self):
+        return (mark_unpickled, ())
+
+
+def test_redis_entries_are_json_and_never_unpickled(app, monkeypatch):
+    client = fakeredis.FakeRedis()
+    writer, reader, third_worker = (RedisCache(client, "test-responses", 100, 60) for _ in range(3))
+    use_backend(monkeypatch, writer)
+    (first,), _ = get(app, "/books/1")
+    [key] = client.keys("test-responses:entry:*")
+    assert set(json.loads(client.get(key))["value"]["body"]) == {"__bytes__"}
+
+    # A worker with an empty local cache serves the same response from the JSON entry
+    use_backend(monkeypatch, reader)
+    (second,), _ = get(app, "/books/1")
+    assert second.headers["x-cache"] == "HIT" and second.content == first.content
+    assert second.headers["content-type"] == first.headers["content-type"]
+
+    # Anything else written there, a pickle included, is a miss rather than code to run
+    client.set(key, pickle.dumps(Exploit()))
+    use_backend(monkeypatch, third_worker)
+    (third,), _ = get(app, "/books/1")
+    assert third.status_code == 200 and third.headers["x-cache"] == "MISS"
+    assert unpickled == []
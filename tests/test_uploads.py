@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tracemalloc
+import pytest
+from benchmarks.common import make_app
+from benchmarks.upload_memory import CHUNK, PEAK_LIMIT, upload
+from models import User
+from routers import users
+
+# UPLOAD_TEST_MB=100 for the full-size run; the default keeps CI fast
+UPLOAD_MB = int(os.getenv("UPLOAD_TEST_MB", "8"))
+SIZE = UPLOAD_MB * 1024 * 1024
+
+
+@pytest.fixture
+def app(library, monkeypatch, tmp_path):
+    monkeypatch.setattr(users, "UPLOAD_DIR", str(tmp_path))
+    return make_app(library)
+
+
+def test_large_upload_is_streamed_in_bounded_memory(app, admin, monkeypatch, tmp_path):
+    monkeypatch.setattr(users, "PICTURE_MAX_BYTES", SIZE + 1)
+    tracemalloc.start()
+    try:
+        state = asyncio.run(upload(app, admin["Authorization"].split()[1], SIZE))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert state["status"] == 200
+    assert peak < PEAK_LIMIT
+    stored = [name for name in os.listdir(tmp_path) if not name.endswith(".part")]
+    assert len(stored) == 1 and os.path.getsize(tmp_path / stored[0]) == SIZE
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_oversized_upload_is_refused_early(app, admin, content_length):
+    size = max(SIZE, 2 * users.PICTURE_MAX_BYTES)
+    state = asyncio.run(upload(app, admin["Authorization"].split()[1], size, content_length=content_length))
+    assert state["status"] == 413
+    # Cut off at the cap (or before reading anything), not after the whole body
+    assert state["read"] <= users.PICTURE_MAX_BYTES + 2 * CHUNK
+
+
+def test_non_image_upload_is_refused_after_the_first_chunk(app, admin, monkeypatch):
+    monkeypatch.setattr(users, "PICTURE_MAX_BYTES", SIZE + 1)
+    state = asyncio.run(upload(app, admin["Authorization"].split()[1], SIZE, head=b"GIF00a not really"))
+    assert state["status"] == 415
+    assert state["read"] <= 2 * CHUNK
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_user_deleted_during_upload_gets_a_404(app, library, auth, monkeypatch, tmp_path, shared):
+    receive_upload = users.receive_upload
+
+    async def receive_then_delete(*args):
+        filename = await receive_upload(*args)
+        with library() as db:
+            if shared:
+                # Another user already has the same image (same content hash, same file)
+                db.query(User).filter(User.id == 6).update({"profile_picture_url": f"/{tmp_path}/{filename}"})
+            db.query(User).filter(User.id == 5).delete()
+            db.commit()
+        return filename
+
+    monkeypatch.setattr(users, "receive_upload", receive_then_delete)
+    state = asyncio.run(upload(app, auth("MAT000005")["Authorization"].split()[1], 4 * CHUNK))
+    assert state["status"] == 404
+    stored = [name for name in os.listdir(tmp_path) if not name.endswith(".part")]
+    assert len(stored) == (1 if shared else 0)
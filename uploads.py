@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import tempfile
+import anyio
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.staticfiles import StaticFiles
+from python_multipart import MultipartParser
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+# Uploads are stored under the SHA-256 of their bytes, so identical images are
+# kept once and a URL's content never changes: /static can hand out strong
+# ETags and `immutable` caching for them.
+
+CHUNK_SIZE = 64 * 1024
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+# <sha256>.<ext>, or <sha256>-<rendition>.<ext> for files derived from one
+CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64}(?:-[a-z]+)?)\.[a-z0-9]+$")
+
+
+def sniff_image(head: bytes) -> str | None:
+    # Trust the bytes, not the filename or the client's Content-Type
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _check_type(head: bytes, extensions) -> str:
+    ext = sniff_image(head)
+    if ext not in extensions:
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    return ext
+
+
+def _store(partial: str, digest, ext: str, directory: str) -> str:
+    filename = f"{digest.hexdigest()}.{ext}"
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        os.replace(partial, path)
+    return filename
+
+
+def _too_large(label: str, max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{label} is larger than {max_bytes // 1024} KiB")
+
+
+def save_upload(upload: UploadFile, directory: str, extensions, max_bytes: int, label: str = "File") -> str:
+    # Streams to a temp file while hashing; returns the stored filename
+    digest = hashlib.sha256()
+    written = 0
+    ext = None
+    fd, partial = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := upload.file.read(CHUNK_SIZE):
+                if ext is None:
+                    ext = _check_type(chunk, extensions)
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(label, max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+        return _store(partial, digest, ext or _check_type(b"", extensions), directory)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+async def receive_upload(request: Request, field: str, directory: str, extensions, max_bytes: int, label: str = "File") -> str:
+    # Async counterpart of save_upload that parses the multipart body as it
+    # arrives, so nothing is spooled first and oversized or non-image uploads
+    # are cut off after the first chunk that gives them away
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise _too_large(label, max_bytes)
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    if b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    part = {"header": b"", "value": b"", "headers": {}, "wanted": False, "found": False}
+    received: list[bytes] = []
+
+    def on_part_begin():
+        part.update(headers={}, wanted=False)
+
+    def on_header_field(data, start, end):
+        part["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header"].lower()] = part["value"]
+        part.update(header=b"", value=b"")
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["wanted"] = not part["found"] and disposition.get(b"name") == field.encode()
+
+    def on_part_data(data, start, end):
+        if part["wanted"]:
+            received.append(data[start:end])
+
+    def on_part_end():
+        if part["wanted"]:
+            part.update(wanted=False, found=True)
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data, "on_part_end": on_part_end,
+    })
+    digest = hashlib.sha256()
+    head = b""
+    ext = None
+    written = 0
+    fd, partial = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+    try:
+        async with await anyio.open_file(partial, "wb") as out:
+            async for chunk in request.stream():
+                try:
+                    parser.write(chunk)
+                except FormParserError:
+                    raise HTTPException(status_code=400, detail="Invalid multipart data")
+                for data in received:
+                    written += len(data)
+                    if written > max_bytes:
+                        raise _too_large(label, max_bytes)
+                    if ext is None and len(head) < 16:
+                        head += data[:16]
+                        if len(head) >= 16:
+                            ext = _check_type(head, extensions)
+                    digest.update(data)
+                    await out.write(data)
+                received.clear()
+            parser.finalize()
+        if not part["found"]:
+            raise HTTPException(status_code=400, detail=f"Missing '{field}' file field")
+        return await anyio.to_thread.run_sync(_store, partial, digest, ext or _check_type(head, extensions), directory)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+class CachedStaticFiles(StaticFiles):
+    # Content-addressed files are cacheable forever with their hash as ETag;
+    # anything else (files from before hashing) must be revalidated
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        match = CONTENT_ADDRESSED.match(os.path.basename(full_path))
+        headers = {"etag": f'"{match.group(1)}"', "cache-control": IMMUTABLE} if match else {"cache-control": "no-cache"}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response